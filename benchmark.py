@@ -0,0 +1,309 @@
+"""Benchmarks of the parse, statistics, batch and plot paths of sbf viewer on synthetic SBF logs"""
+
+from argparse import ArgumentParser, SUPPRESS
+from pathlib import Path
+
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from src import sat_statistics
+from src.event_sampling import EVENT_SAMPLING
+from src.satellite import Satellite
+from src.sbf_index import SbfFile
+from src.signal_cache import SignalCache
+from src.sbf_writer import write_sbf
+from src.timings import peak_rss_mb
+
+RESULTS_VERSION = 2
+CHILD_BENCHMARKS = ('memory', 'stream_memory', 'redraw')
+ZOOM_FRACTION = 0.1
+# Wall time [s] a headless batch run may take to start, process nothing and exit
+STARTUP_BUDGET_S = 1.0
+GUI_MODULES = ('PyQt5', 'matplotlib')
+GUI_IMPORT_CHECK = 'import json, sys; import sbf_viewer; print(json.dumps([m for m in {!r} if m in sys.modules]))'
+
+
+def timed(function, repeat):
+    """Best wall time of repeat calls of function, and its last result"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def bench_parse(sbf_file, repeat):
+    """Loads without caches, the block scan alone, and opens reusing the cached block index or decoded signals"""
+    def open_index(cache=None):
+        with SbfFile(sbf_file, cache) as sbf:
+            return len(sbf.index)
+
+    size = sbf_file.stat().st_size
+    results = {'bytes': size}
+    cold_s, satellite = timed(lambda: Satellite(sbf_file), repeat)
+    stream_s, _ = timed(lambda: Satellite(sbf_file, streaming=True), repeat)
+    scan_s, blocks = timed(open_index, repeat)
+    results['blocks'] = blocks
+    results['decoded_blocks'] = satellite.n_blocks
+    with tempfile.TemporaryDirectory() as directory:
+        cache = SignalCache(directory)
+        open_index(cache)
+        indexed_s, _ = timed(lambda: open_index(cache), repeat)
+        Satellite(sbf_file, signal_cache=cache)
+        reopen_s, _ = timed(lambda: Satellite(sbf_file, signal_cache=cache), repeat)
+    for name, seconds in (('cold', cold_s), ('stream', stream_s), ('scan', scan_s), ('indexed', indexed_s),
+                          ('reopen', reopen_s)):
+        results[name + '_s'] = seconds
+        results[name + '_mb_per_s'] = size / seconds / 1e6
+        results[name + '_blocks_per_s'] = blocks / seconds
+    return results
+
+
+def bench_stats(sbf_file, repeat):
+    results = dict()
+    for mode in EVENT_SAMPLING:
+        satellite = Satellite(sbf_file, event_sampling=mode)
+        results['statistics_{}_s'.format(mode)], _ = timed(satellite.update_statistics, repeat)
+    results['check_s'], _ = timed(satellite.check, repeat)
+    results['dict_df_s'], _ = timed(satellite.to_dict_df, repeat)
+    return results
+
+
+def bench_batch(sbf_file, file_counts, jobs_list):
+    """Batch processing of copies of sbf_file without caches"""
+    results = list()
+    size = sbf_file.stat().st_size
+    with tempfile.TemporaryDirectory() as directory:
+        directory = Path(directory)
+        for n_files in file_counts:
+            for i in range(n_files):
+                copy = directory / '{:04d}.sbf'.format(i)
+                if not copy.exists():
+                    shutil.copyfile(str(sbf_file), str(copy))
+            for jobs in jobs_list:
+                with contextlib.redirect_stdout(io.StringIO()):
+                    start = time.perf_counter()
+                    sat_statistics.run(str(directory), jobs, use_cache=False)
+                    seconds = time.perf_counter() - start
+                results.append({'files': n_files, 'jobs': jobs, 'seconds': seconds,
+                                'files_per_s': n_files / seconds, 'mb_per_s': n_files * size / seconds / 1e6})
+    return results
+
+
+def bench_startup(repeat, budget=STARTUP_BUDGET_S):
+    """Wall time of headless sbf_viewer.py runs in fresh interpreters without a display
+
+    Also lists the GUI modules importing sbf_viewer pulls in, batch mode and
+    its worker processes should not need any."""
+    root = Path(__file__).resolve().parent
+    env = {name: value for name, value in os.environ.items() if name not in ('DISPLAY', 'WAYLAND_DISPLAY')}
+
+    def start(command):
+        return lambda: subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, env=env,
+                                      cwd=str(root), check=True)
+
+    results = dict()
+    with tempfile.TemporaryDirectory() as directory:
+        commands = {
+            'interpreter': [sys.executable, '-c', 'pass'],
+            'help': [sys.executable, 'sbf_viewer.py', '--help'],
+            'batch_empty': [sys.executable, 'sbf_viewer.py', '-b', directory, '--no_cache']
+        }
+        for name, command in commands.items():
+            results[name + '_s'], _ = timed(start(command), repeat)
+    imports = subprocess.run([sys.executable, '-c', GUI_IMPORT_CHECK.format(GUI_MODULES)], stdout=subprocess.PIPE,
+                             env=env, cwd=str(root), universal_newlines=True, check=True)
+    results['gui_modules'] = json.loads(imports.stdout)
+    results['budget_s'] = budget
+    results['within_budget'] = results['batch_empty_s'] <= budget and not results['gui_modules']
+    return results
+
+
+def print_startup(startup):
+    print('Headless batch startup: {:.3f} s, budget {:.3f} s, GUI modules imported: {}'.format(
+        startup['batch_empty_s'], startup['budget_s'], ', '.join(startup['gui_modules']) or 'none'))
+
+
+def run_child(benchmark, sbf_file, repeat):
+    """Runs a benchmark in a fresh interpreter, so its peak RSS and Qt state are its own"""
+    env = dict(os.environ, QT_QPA_PLATFORM='offscreen')
+    child = subprocess.run([sys.executable, str(Path(__file__).resolve()), str(sbf_file),
+                            '--child', benchmark, '--repeat', str(repeat)],
+                           stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True, env=env)
+    try:
+        return json.loads(child.stdout.strip().splitlines()[-1])
+    except (IndexError, ValueError):
+        return {'skipped': child.stderr.strip().splitlines()[-1] if child.stderr.strip() else 'no output'}
+
+
+def child_memory(sbf_file, streaming):
+    baseline = peak_rss_mb()
+    Satellite(sbf_file, streaming=streaming).check()
+    return {'baseline_rss_mb': baseline, 'peak_rss_mb': peak_rss_mb()}
+
+
+def child_redraw(sbf_file, repeat):
+    try:
+        from PyQt5 import QtWidgets
+        from src.gui import ApplicationWindow
+    except ImportError as e:
+        return {'skipped': repr(e)}
+    app = QtWidgets.QApplication(sys.argv[:1])
+    window = ApplicationWindow(Satellite(sbf_file))
+    window.show()
+    app.processEvents()
+
+    def zoom():
+        for plot in (window.top_plot, window.bot_plot):
+            x_min, x_max = plot.axes.get_xlim()
+            plot.axes.set_xlim(x_min, x_min + (x_max - x_min) * ZOOM_FRACTION)
+            plot.draw()
+            plot.axes.set_xlim(x_min, x_max)
+            plot.draw()
+
+    def toggle():
+        window.toggle_events()
+        window.toggle_mean()
+
+    results = dict()
+    results['update_view_s'], _ = timed(window.update_view, repeat)
+    results['toggle_overlays_s'], _ = timed(toggle, repeat)
+    results['zoom_in_out_s'], _ = timed(zoom, repeat)
+    window.close()
+    return results
+
+
+def versions():
+    results = {'python': platform.python_version(), 'numpy': np.__version__, 'pandas': pd.__version__,
+               'platform': platform.platform(), 'cpu_count': os.cpu_count()}
+    try:
+        import matplotlib
+        results['matplotlib'] = matplotlib.__version__
+    except ImportError:
+        pass
+    try:
+        results['commit'] = subprocess.check_output(['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL,
+                                                    cwd=str(Path(__file__).resolve().parent),
+                                                    universal_newlines=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        pass
+    return results
+
+
+def int_list(text):
+    return [int(value) for value in text.split(',')]
+
+
+def main():
+    parser = ArgumentParser(description='Benchmarks of sbf viewer, results are written as JSON')
+    parser.add_argument('sbf_file',
+                        nargs='?',
+                        help='Benchmark this .sbf file instead of a synthetic one',
+                        type=str,
+                        default='')
+    parser.add_argument('--output', '-o',
+                        help='JSON file to write the results to',
+                        type=str,
+                        default='benchmark_results.json')
+    parser.add_argument('--duration',
+                        help='Duration of the synthetic log [s]',
+                        type=float,
+                        default=600)
+    parser.add_argument('--rate',
+                        help='Measurement rate of the synthetic log [Hz]',
+                        type=int,
+                        default=10)
+    parser.add_argument('--sats',
+                        help='Number of satellites in the synthetic log',
+                        type=int,
+                        default=16)
+    parser.add_argument('--event_rate',
+                        help='Mean number of external events per second in the synthetic log',
+                        type=float,
+                        default=1.0)
+    parser.add_argument('--repeat',
+                        help='Number of runs of every timing, the best one is reported',
+                        type=int,
+                        default=3)
+    parser.add_argument('--batch_files',
+                        help='Comma separated numbers of files for the batch scaling benchmark',
+                        type=int_list,
+                        default=[1, 2, 4])
+    parser.add_argument('--batch_jobs',
+                        help='Comma separated numbers of processes for the batch scaling benchmark',
+                        type=int_list,
+                        default=[1, 2])
+    parser.add_argument('--no_redraw',
+                        help='Skip the headless plot benchmark',
+                        action='store_true')
+    parser.add_argument('--startup_budget',
+                        help='Max. wall time [s] of a headless batch run which processes no file',
+                        type=float,
+                        default=STARTUP_BUDGET_S)
+    parser.add_argument('--startup_only',
+                        help='Only benchmark the headless startup, exit with status 1 if it exceeds the budget',
+                        action='store_true')
+    parser.add_argument('--child',
+                        help=SUPPRESS,
+                        choices=CHILD_BENCHMARKS)
+    args = parser.parse_args()
+
+    if args.child == 'redraw':
+        print(json.dumps(child_redraw(Path(args.sbf_file), args.repeat)))
+        return
+    if args.child:
+        print(json.dumps(child_memory(Path(args.sbf_file), args.child == 'stream_memory')))
+        return
+    if args.startup_only:
+        startup = bench_startup(args.repeat, args.startup_budget)
+        with open(args.output, 'w') as output:
+            json.dump({'version': RESULTS_VERSION, 'environment': versions(), 'startup': startup}, output, indent=2)
+        print_startup(startup)
+        sys.exit(0 if startup['within_budget'] else 1)
+
+    with tempfile.TemporaryDirectory() as directory:
+        config = {'repeat': args.repeat, 'batch_files': args.batch_files, 'batch_jobs': args.batch_jobs}
+        sbf_file = Path(directory) / 'benchmark.sbf'
+        if args.sbf_file:
+            sbf_file = Path(args.sbf_file)
+            config['sbf_file'] = args.sbf_file
+        else:
+            config.update({'duration_s': args.duration, 'rate_hz': args.rate, 'sats': args.sats,
+                           'event_rate_hz': args.event_rate})
+            start = time.perf_counter()
+            write_sbf(sbf_file, args.duration, args.rate, args.sats, args.event_rate)
+            config['write_s'] = time.perf_counter() - start
+
+        results = {'version': RESULTS_VERSION, 'environment': versions(), 'config': config}
+        print('Benchmarking {} ({:.1f} MB)'.format(sbf_file, sbf_file.stat().st_size / 1e6))
+        results['startup'] = bench_startup(args.repeat, args.startup_budget)
+        results['parse'] = bench_parse(sbf_file, args.repeat)
+        results['stats'] = bench_stats(sbf_file, args.repeat)
+        results['memory'] = {'full': run_child('memory', sbf_file, 1),
+                             'stream': run_child('stream_memory', sbf_file, 1)}
+        results['batch'] = bench_batch(sbf_file, args.batch_files, args.batch_jobs)
+        if not args.no_redraw:
+            results['redraw'] = run_child('redraw', sbf_file, args.repeat)
+
+    with open(args.output, 'w') as output:
+        json.dump(results, output, indent=2)
+    print('Parse: {:.1f} MB/s, {:.0f} blocks/s'.format(results['parse']['cold_mb_per_s'],
+                                                        results['parse']['cold_blocks_per_s']))
+    print_startup(results['startup'])
+    print('Results written to {}'.format(args.output))
+
+
+if __name__ == "__main__":
+    main()
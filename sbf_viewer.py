@@ -3,29 +3,120 @@
 __author__ = 'Marco Job'
 __license__ = 'GPL'
 
-from argparse import ArgumentParser
+from argparse import ArgumentParser, ArgumentTypeError
 
-from src.gui import run_GUI
-from src.satellite import Satellite
-from src import sat_statistics
+import cProfile
+
+from src.satellite import Satellite, WINDOW_EVENTS
+from src.signal_cache import SignalCache
+from src import sat_statistics, sbf_stream
+from src.result_writer import EXPORT_FORMATS
+from src.event_sampling import EVENT_SAMPLING, SNAP_MS
 
 def main():
     parser = ArgumentParser(description='Tool used to analyse sbf files')
     parser.add_argument('sbf_file',
                         nargs='?',
-                        help='Path to .sbf file to open',
+                        help='Path to .sbf file to open, or tcp://host:port with --follow',
                         type=str,
                         default='')
     parser.add_argument('--batch_processing', '-b',
                         help='Path to directory on which to perform batch processing. If given, overrides any GUI commands',
                         type=str)
+    parser.add_argument('--jobs', '-j',
+                        help='Number of processes used for batch processing',
+                        type=int,
+                        default=1)
+    parser.add_argument('--no_cache',
+                        help='Decode files again instead of reusing cached batch results or decoded signals',
+                        action='store_true')
+    parser.add_argument('--export',
+                        help='Additionally write the batch results in this format',
+                        choices=EXPORT_FORMATS)
+    parser.add_argument('--stream',
+                        help='Batch process files chunk by chunk with bounded memory, for very long logs',
+                        action='store_true')
+    parser.add_argument('--windows',
+                        help='Batch process also per window of this length [s], or between consecutive external events with "{}", into ppk_quality_windows.csv'.format(WINDOW_EVENTS),
+                        type=window_spec)
+    parser.add_argument('--compare',
+                        help='Compare these .sbf files and batch directories side by side, loading --jobs files in parallel',
+                        nargs='+',
+                        metavar='PATH')
+    parser.add_argument('--follow', '-f',
+                        help='Follow the growing sbf_file or tcp://host:port stream and update the plots live',
+                        action='store_true')
+    parser.add_argument('--replay',
+                        help='Serve sbf_file on this local TCP port as a receiver would stream it, for testing --follow',
+                        type=int)
+    parser.add_argument('--replay_speed',
+                        help='Replay speed as a multiple of real time',
+                        type=float,
+                        default=1.0)
+    parser.add_argument('--event_sampling',
+                        help='How CN0 is sampled at external events: snap to the 100 ms epoch, nearest epoch or interpolated',
+                        choices=EVENT_SAMPLING,
+                        default='snap')
+    parser.add_argument('--event_tolerance',
+                        help='Max. distance [ms] of the epochs used by nearest and interp event sampling',
+                        type=int,
+                        default=SNAP_MS)
+    parser.add_argument('--timings',
+                        help='Print the time spent per processing stage, in batch mode also write it per file to ppk_quality_timings.csv',
+                        action='store_true')
+    parser.add_argument('--profile',
+                        help='Write a cProfile dump of the main process to this file (default: sbf_viewer.prof)',
+                        nargs='?',
+                        const='sbf_viewer.prof')
     args = parser.parse_args()
 
-    if not args.batch_processing:
-        satellite = Satellite(args.sbf_file)
-        run_GUI(satellite)
+    profiler = cProfile.Profile() if args.profile else None
+    if profiler is not None:
+        profiler.enable()
+    try:
+        run(args)
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(args.profile)
+            print('Profile written to {}'.format(args.profile))
+
+
+def window_spec(text):
+    if text == WINDOW_EVENTS:
+        return text
+    try:
+        seconds = float(text)
+    except ValueError:
+        seconds = 0
+    if not seconds > 0:
+        raise ArgumentTypeError('expected a window length [s] or "{}"'.format(WINDOW_EVENTS))
+    return seconds
+
+
+def run(args):
+    options = {'event_sampling': args.event_sampling, 'event_tolerance': args.event_tolerance,
+               'timings': args.timings}
+    if (args.stream or args.follow) and args.event_sampling != 'snap':
+        print('Error: --{} only supports --event_sampling snap'.format('stream' if args.stream else 'follow'))
+    elif args.replay:
+        sbf_stream.replay(args.sbf_file, args.replay, args.replay_speed)
+    elif args.compare:
+        from src.compare import run_compare
+        options['signal_cache'] = None if args.no_cache else SignalCache()
+        run_compare(args.compare, options, args.jobs)
+    elif args.follow:
+        from src.gui import run_GUI
+        run_GUI(Satellite(**options), follow=args.sbf_file)
+    elif not args.batch_processing:
+        from src.gui import run_GUI
+        signal_cache = None if args.no_cache else SignalCache()
+        run_GUI(Satellite(signal_cache=signal_cache, **options), load=args.sbf_file)
+    elif args.windows is not None and args.stream:
+        print('Error: --windows needs the stored signals and does not work with --stream')
     else:
-        sat_statistics.run(args.batch_processing)
+        options['streaming'] = args.stream
+        sat_statistics.run(args.batch_processing, args.jobs, not args.no_cache, args.export, options, args.windows)
 
 
 if __name__ == "__main__":
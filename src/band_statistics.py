@@ -0,0 +1,113 @@
+'''Per-satellite CN0 and per-frontend gain statistics, computed in one grouped pass over all series'''
+import numpy as np
+import pandas as pd
+
+from .event_sampling import sample_events, series_key
+
+CN0_STEP = 0.25
+PERCENTILES = (5, 50, 95)
+KEY_COLUMNS = ['band', 'sat', 'sig_num', 'svid']
+PERCENTILE_COLUMNS = ['p{}'.format(q) for q in PERCENTILES]
+THRESHOLD_COLUMNS = ['n_over_best', 'n_over_good']
+SAMPLE_COLUMNS = ['max'] + PERCENTILE_COLUMNS + THRESHOLD_COLUMNS
+SAT_COLUMNS = KEY_COLUMNS + ['count', 'mean'] + SAMPLE_COLUMNS + ['event_count', 'event_mean', 'value']
+GAIN_STAT_COLUMNS = ['sig_num', 'count', 'mean']
+
+
+def satellite_table(keys, series, thresholds, events, mode, tolerance):
+    '''One row per series with its sample count, mean, max, percentiles, the number
+    of samples at or over the (best, good) thresholds of its band and the mean at the events
+
+    keys is a list of (band, sat, sig_num, svid), series the matching list of
+    (tow, cn0) and thresholds maps a band to its (best, good) thresholds.
+    value is what a satellite is ranked by: its event mean if there are events,
+    0 if it has no sample at any of them, else its mean.
+
+    CN0 is decoded in steps of CN0_STEP, so all sample statistics are read off
+    one histogram per series, built by a single bincount over all samples.'''
+    if not series:
+        return pd.DataFrame(columns=SAT_COLUMNS)
+    table = pd.DataFrame(keys, columns=KEY_COLUMNS)
+    lengths = np.array([len(cn0) for tow, cn0 in series], dtype=np.int64)
+    steps = np.concatenate([np.rint(np.asarray(cn0) / CN0_STEP).astype(np.int64) for tow, cn0 in series])
+    n_steps = int(steps.max()) + 1 if steps.size else 1
+    group = np.repeat(np.arange(len(series)), lengths)
+    histogram = np.bincount(group * n_steps + steps, minlength=len(series) * n_steps).reshape(len(series), n_steps)
+    cumulative = np.cumsum(histogram, axis=1)
+    step_values = np.arange(n_steps) * CN0_STEP
+
+    table['count'] = lengths
+    table['mean'] = histogram @ step_values / lengths
+    table['max'] = step_values[n_steps - 1 - np.argmax(histogram[:, ::-1] > 0, axis=1)]
+    for q, name in zip(PERCENTILES, PERCENTILE_COLUMNS):
+        # Linear interpolation between the neighbouring ranks, as numpy.percentile
+        position = (lengths - 1) * q / 100.
+        low = np.floor(position).astype(np.int64)
+        high = np.minimum(low + 1, lengths - 1)
+        low_value = step_values[np.argmax(cumulative > low[:, None], axis=1)]
+        high_value = step_values[np.argmax(cumulative > high[:, None], axis=1)]
+        table[name] = low_value + (high_value - low_value) * (position - low)
+    for i, name in enumerate(THRESHOLD_COLUMNS):
+        first = np.array([np.ceil(thresholds[band][i] / CN0_STEP) for band in table['band']], dtype=np.int64)
+        below = np.where(first > 0, cumulative[np.arange(len(series)), np.clip(first - 1, 0, n_steps - 1)], 0)
+        table[name] = np.where(first < n_steps, lengths - below, 0)
+
+    if len(events):
+        key, values = series_key(series)
+        sampled = sample_events(key, values, len(series), events, mode, tolerance)
+        found = ~np.isnan(sampled)
+        event_count = found.sum(axis=1)
+        event_sum = np.where(found, sampled, 0.0).sum(axis=1)
+        table['event_count'] = event_count
+        table['event_mean'] = np.where(event_count > 0, event_sum / np.maximum(event_count, 1), np.nan)
+        table['value'] = np.where(event_count > 0, table['event_mean'], 0.0)
+    else:
+        table['event_count'] = 0
+        table['event_mean'] = np.nan
+        table['value'] = table['mean']
+    return table
+
+
+def running_table(keys, aggregates, event_sampled):
+    '''Like satellite_table, but from the (count, sum, event count, event sum) of
+    RunningStats, so the SAMPLE_COLUMNS are unknown'''
+    if not aggregates:
+        return pd.DataFrame(columns=SAT_COLUMNS)
+    table = pd.DataFrame(keys, columns=KEY_COLUMNS)
+    count, total, event_count, event_sum = (np.array(column) for column in zip(*aggregates))
+    table['count'] = count.astype(np.int64)
+    table['mean'] = total / count
+    for name in SAMPLE_COLUMNS:
+        table[name] = np.nan
+    table['event_count'] = event_count.astype(np.int64)
+    table['event_mean'] = np.where(event_count > 0, event_sum / np.maximum(event_count, 1), np.nan)
+    if event_sampled:
+        table['value'] = np.where(event_count > 0, table['event_mean'], 0.0)
+    else:
+        table['value'] = table['mean']
+    return table[SAT_COLUMNS]
+
+
+def gain_table(gains):
+    '''Mean gain per frontend from a dict of sig_num: gain array, in one bincount'''
+    if not gains:
+        return pd.DataFrame(columns=GAIN_STAT_COLUMNS)
+    lengths = np.array([len(gain) for gain in gains.values()], dtype=np.int64)
+    group = np.repeat(np.arange(len(gains)), lengths)
+    values = np.concatenate([np.asarray(gain, dtype=np.float64) for gain in gains.values()])
+    return pd.DataFrame({'sig_num': list(gains), 'count': lengths,
+                         'mean': np.bincount(group, weights=values, minlength=len(gains)) / lengths})
+
+
+def band_summary(table, band, top_length, thresholds):
+    '''Ranking of the satellites of band by value: the best one, the mean of the
+    top_length best ones and the number of satellites at or over every threshold'''
+    values = np.sort(table.loc[table['band'] == band, 'value'].to_numpy(dtype=np.float64))[::-1]
+    length = min(top_length, values.size)
+    return {
+        'n_sats': values.size,
+        'max': values[0] if values.size else None,
+        'top_length': length,
+        'top_mean': values[:length].mean() if length else np.nan,
+        'n_over': {threshold: int(np.count_nonzero(values >= threshold)) for threshold in thresholds}
+    }
@@ -0,0 +1,378 @@
+from .satellite import Satellite, LoadCancelled
+from .sat_statistics import log_files
+from .decimation import DecimationPyramid
+from .gps_time import gps_days
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
+from matplotlib.backends.backend_qt5agg import NavigationToolbar2QT as NavigationToolbar
+from PyQt5 import QtCore, QtWidgets
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import numpy as np
+import pandas as pd
+import itertools
+import sys
+import matplotlib
+
+OUTPUT_CSV = 'ppk_quality_output.csv'
+MAX_LOADED = 4
+MAX_SHOWN = 8
+PLOT_POINTS = 4000
+MIN_PER_DAY = 1440.0
+ROWS = (('1', "L1 CNR [dB-Hz]"), ('2', "L2 CNR [dB-Hz]"), ('gain', "Frontend gain [dB]"))
+
+
+class Dataset:
+    """One file of the comparison
+
+    Its metrics are kept once known, its decoded signals and plot series
+    only while it is shown or among the last used ones."""
+
+    def __init__(self, path, metrics=None):
+        self.path = Path(path)
+        self.metrics = metrics
+        self.satellite = None
+        self.series = None
+        self.loading = None
+        self.last_used = 0
+
+    def name(self):
+        return self.path.name
+
+    def loaded(self):
+        return self.series is not None
+
+    def evict(self):
+        self.satellite = None
+        self.series = None
+
+
+class LoadJob:
+    """A pending load of a Dataset, cancelled through the progress callback of Satellite.load_file"""
+
+    def __init__(self, dataset):
+        self.dataset = dataset
+        self.cancelled = False
+
+    def report_progress(self, bytes_read, blocks):
+        if self.cancelled:
+            raise LoadCancelled()
+
+
+class DatasetPool(QtCore.QObject):
+    """Loads datasets on worker threads and keeps at most max_loaded of the ones not shown decoded
+
+    Series are decimated on the worker thread, so the GUI thread only plots."""
+    loaded = QtCore.pyqtSignal(object, object, object)
+    failed = QtCore.pyqtSignal(object, str)
+    metrics_done = QtCore.pyqtSignal(object, object)
+
+    def __init__(self, datasets, options, workers=1, max_loaded=MAX_LOADED, parent=None):
+        QtCore.QObject.__init__(self, parent)
+        self.datasets = datasets
+        self.options = options
+        self.max_loaded = max_loaded
+        self.executor = ThreadPoolExecutor(max_workers=max(workers, 1))
+        self.metrics_executor = ThreadPoolExecutor(max_workers=1)
+        self.clock = itertools.count(1)
+        self.loaded.connect(self.on_loaded)
+
+    def request(self, shown):
+        """Starts loading the shown datasets which are not loaded yet and evicts the others"""
+        for dataset in shown:
+            dataset.last_used = next(self.clock)
+            if not dataset.loaded() and dataset.loading is None:
+                dataset.loading = LoadJob(dataset)
+                self.executor.submit(self.load, dataset.loading)
+        for dataset in self.datasets:
+            if dataset not in shown and dataset.loading is not None:
+                dataset.loading.cancelled = True
+                dataset.loading = None
+        self.evict(shown)
+
+    def evict(self, shown):
+        kept = sorted((dataset for dataset in self.datasets if dataset.loaded() and dataset not in shown),
+                      key=lambda dataset: dataset.last_used, reverse=True)
+        for dataset in kept[self.max_loaded:]:
+            dataset.evict()
+
+    def load(self, job):
+        try:
+            satellite = Satellite(**self.options)
+            satellite.load_file(job.dataset.path, progress=job.report_progress)
+            series = plot_series(satellite)
+        except LoadCancelled:
+            return
+        except Exception as e:
+            self.failed.emit(job, repr(e))
+            return
+        self.loaded.emit(job, satellite, series)
+
+    def on_loaded(self, job, satellite, series):
+        dataset = job.dataset
+        if job.cancelled or dataset.loading is not job:
+            return
+        dataset.loading = None
+        dataset.satellite = satellite
+        dataset.series = series
+        dataset.metrics = satellite.check()[1]
+
+    def compute_metrics(self):
+        """Computes the metrics missing from the batch output, one file after the other
+
+        Streaming mode keeps the memory bounded where the event sampling allows it."""
+        for dataset in self.datasets:
+            if dataset.metrics is None:
+                self.metrics_executor.submit(self.metrics, dataset)
+
+    def metrics(self, dataset):
+        try:
+            streaming = self.options.get('event_sampling', 'snap') == 'snap'
+            metrics = Satellite(dataset.path, **dict(self.options, streaming=streaming, signal_cache=None)).check()[1]
+        except Exception as e:
+            print("Error: computing the metrics of {} failed: {!r}".format(dataset.path, e))
+            return
+        self.metrics_done.emit(dataset, metrics)
+
+    def shutdown(self):
+        for dataset in self.datasets:
+            if dataset.loading is not None:
+                dataset.loading.cancelled = True
+        for executor in (self.executor, self.metrics_executor):
+            executor.shutdown(wait=True)
+
+
+def plot_series(satellite):
+    """Decimated (label, x, y) series per plot row, x in minutes since the first epoch of the file"""
+    columns = [columns for key, columns in satellite.signals.items()] + list(satellite.gain_signals.values())
+    starts = [gps_days(columns['wnc'][:1], columns['tow'][:1]) for columns in columns if len(columns)]
+    start = np.min(starts) if starts else 0.0
+    series = {row: list() for row, label in ROWS}
+    for band in ('1', '2'):
+        for sat, columns in satellite.band_series(band):
+            series[band].append((sat,) + decimated(columns, columns['cn0'], start))
+    for sig_num, columns in satellite.gain_signals.items():
+        label = satellite.gain_num_ref[sig_num]['sig_type']
+        series['gain'].append((label,) + decimated(columns, columns['gain'].astype(np.float32), start))
+    return series
+
+
+def decimated(columns, y, start):
+    x = (gps_days(columns['wnc'], columns['tow']) - start) * MIN_PER_DAY
+    return DecimationPyramid(x, y).select(-np.inf, np.inf, PLOT_POINTS)
+
+
+def read_metrics(paths, files):
+    """check() results of earlier batch runs, from the batch output in the given
+    directories or next to the given files, keyed by the resolved file path
+
+    The batch output names files as they were given to the batch run, so rows
+    are matched by the path relative to the batch directory."""
+    csv_files = {Path(path) / OUTPUT_CSV if Path(path).is_dir() else Path(path).parent / OUTPUT_CSV
+                 for path in paths}
+    metrics = dict()
+    for csv_file in csv_files:
+        if not csv_file.is_file():
+            continue
+        try:
+            table = pd.read_csv(str(csv_file), index_col=0)
+        except (OSError, ValueError) as e:
+            print("Error: cannot read {}: {}".format(csv_file, e))
+            continue
+        rows = {Path(str(idx)).parts: row for idx, row in table.iterrows()}
+        for file in files:
+            try:
+                relative = file.resolve().relative_to(csv_file.parent.resolve()).parts
+            except ValueError:
+                continue
+            for parts, row in rows.items():
+                if parts[-len(relative):] == relative:
+                    metrics[str(file.resolve())] = row.dropna().to_dict()
+                    break
+    return metrics
+
+
+def comparison_files(paths):
+    """SBF files of the given files and batch directories"""
+    files = list()
+    for path in paths:
+        path = Path(path)
+        if path.is_dir():
+            files.extend(sorted(log_files(path)))
+        elif path.is_file():
+            files.append(path)
+        else:
+            print("Error: {} does not exist".format(path))
+    return files
+
+
+class CompareWindow(QtWidgets.QMainWindow):
+    """Metrics of many files in a sortable table, the selected files plotted overlaid or tiled
+
+    Double clicking a row opens the file in its own viewer window."""
+
+    def __init__(self, paths, options=None, workers=1):
+        QtWidgets.QMainWindow.__init__(self)
+        self.setAttribute(QtCore.Qt.WA_DeleteOnClose)
+        self.setWindowTitle("sbf viewer - compare")
+        self.resize(1800, 1000)
+        self.options = options or dict()
+        self.viewers = list()
+        self.shown = list()
+
+        files = comparison_files(paths)
+        known = read_metrics(paths, files)
+        self.datasets = [Dataset(path, known.get(str(path.resolve()))) for path in files]
+        self.pool = DatasetPool(self.datasets, self.options, workers, parent=self)
+        self.pool.loaded.connect(self.on_loaded)
+        self.pool.failed.connect(self.on_failed)
+        self.pool.metrics_done.connect(self.on_metrics)
+
+        self.view_menu = QtWidgets.QMenu(' &View', self)
+        self.tile_action = self.view_menu.addAction(' &Tile files', self.update_plot,
+                                                    QtCore.Qt.CTRL + QtCore.Qt.Key_L)
+        self.tile_action.setCheckable(True)
+        self.view_menu.addAction(' &Compute missing metrics', self.pool.compute_metrics)
+        self.menuBar().setNativeMenuBar(False)
+        self.menuBar().addMenu(self.view_menu)
+
+        self.columns = Satellite(**self.options).check_columns()
+        self.table = QtWidgets.QTableWidget(len(self.datasets), len(self.columns) + 1, self)
+        self.table.setHorizontalHeaderLabels(["File"] + self.columns)
+        self.table.setSelectionBehavior(QtWidgets.QAbstractItemView.SelectRows)
+        self.table.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
+        for row, dataset in enumerate(self.datasets):
+            item = QtWidgets.QTableWidgetItem(dataset.name())
+            item.setData(QtCore.Qt.UserRole, row)
+            item.setToolTip(str(dataset.path))
+            self.table.setItem(row, 0, item)
+            self.fill_metrics(row, dataset)
+        self.table.setSortingEnabled(True)
+        self.table.sortItems(0, QtCore.Qt.AscendingOrder)
+        self.table.resizeColumnsToContents()
+        self.table.itemSelectionChanged.connect(self.on_selection)
+        self.table.cellDoubleClicked.connect(self.open_viewer)
+
+        self.fig = Figure(figsize=(8, 6), dpi=100)
+        self.canvas = FigureCanvas(self.fig)
+        plot_widget = QtWidgets.QWidget(self)
+        plot_layout = QtWidgets.QVBoxLayout(plot_widget)
+        plot_layout.addWidget(NavigationToolbar(self.canvas, plot_widget))
+        plot_layout.addWidget(self.canvas)
+
+        splitter = QtWidgets.QSplitter(QtCore.Qt.Horizontal, self)
+        splitter.addWidget(self.table)
+        splitter.addWidget(plot_widget)
+        splitter.setSizes([700, 1100])
+        self.setCentralWidget(splitter)
+        if self.datasets:
+            self.table.selectRow(0)
+        self.update_plot()
+
+    def dataset_of_row(self, row):
+        return self.datasets[self.table.item(row, 0).data(QtCore.Qt.UserRole)]
+
+    def row_of_dataset(self, dataset):
+        index = self.datasets.index(dataset)
+        for row in range(self.table.rowCount()):
+            if self.table.item(row, 0).data(QtCore.Qt.UserRole) == index:
+                return row
+        return None
+
+    def fill_metrics(self, row, dataset):
+        """Numbers are stored as numbers, so the columns sort numerically"""
+        sorting = self.table.isSortingEnabled()
+        self.table.setSortingEnabled(False)
+        for column, name in enumerate(self.columns, 1):
+            value = (dataset.metrics or dict()).get(name)
+            item = QtWidgets.QTableWidgetItem()
+            if isinstance(value, (int, float, np.number)):
+                if not np.isnan(value):
+                    item.setData(QtCore.Qt.DisplayRole, round(float(value), 2))
+            elif value is not None:
+                item.setData(QtCore.Qt.DisplayRole, str(value))
+            self.table.setItem(row, column, item)
+        self.table.setSortingEnabled(sorting)
+
+    def on_selection(self):
+        rows = sorted({index.row() for index in self.table.selectionModel().selectedRows()})
+        if len(rows) > MAX_SHOWN:
+            self.statusBar().showMessage("Showing the first {} of {} selected files".format(MAX_SHOWN, len(rows)), 5000)
+        self.shown = [self.dataset_of_row(row) for row in rows[:MAX_SHOWN]]
+        self.pool.request(self.shown)
+        self.update_plot()
+
+    def on_loaded(self, job, satellite, series):
+        dataset = job.dataset
+        if dataset.loaded():
+            self.fill_metrics(self.row_of_dataset(dataset), dataset)
+        if dataset in self.shown:
+            self.update_plot()
+
+    def on_failed(self, job, message):
+        if job.dataset.loading is not job:
+            return
+        job.dataset.loading = None
+        print("Error: loading {} failed: {}".format(job.dataset.path, message))
+        self.statusBar().showMessage("Loading {} failed: {}".format(job.dataset.name(), message), 5000)
+
+    def on_metrics(self, dataset, metrics):
+        if dataset.metrics is None:
+            dataset.metrics = metrics
+            self.fill_metrics(self.row_of_dataset(dataset), dataset)
+
+    def update_plot(self):
+        """Overlays the shown files on one column of axes, or gives every file its own column
+
+        All axes share the x axis, minutes since the first epoch of each file."""
+        self.fig.clear()
+        tiled = self.tile_action.isChecked()
+        n_columns = max(len(self.shown), 1) if tiled else 1
+        axes = self.fig.subplots(len(ROWS), n_columns, sharex=True, sharey='row', squeeze=False)
+        colors = matplotlib.rcParams['axes.prop_cycle'].by_key()['color']
+        labelled = False
+        for i, dataset in enumerate(self.shown):
+            column = i if tiled else 0
+            color = None if tiled else colors[i % len(colors)]
+            if not dataset.loaded():
+                axes[0, column].set_title("{} (loading)".format(dataset.name()), fontsize=9)
+                continue
+            for row, (key, label) in enumerate(ROWS):
+                for j, (name, x, y) in enumerate(dataset.series[key]):
+                    axes[row, column].plot(x, y, '.', markersize=2, color=color,
+                                           label=dataset.name() if j == 0 and row == 0 and not tiled else None)
+                    labelled = labelled or (j == 0 and row == 0)
+            if tiled:
+                axes[0, column].set_title(dataset.name(), fontsize=9)
+        for row, (key, label) in enumerate(ROWS):
+            axes[row, 0].set_ylabel(label)
+        for column in range(n_columns):
+            axes[-1, column].set_xlabel("Time since first epoch [min]")
+        if not tiled and labelled:
+            axes[0, 0].legend(loc='lower right', fontsize=8, markerscale=4)
+        self.canvas.draw_idle()
+
+    def open_viewer(self, row, column):
+        from .gui import ApplicationWindow
+        dataset = self.dataset_of_row(row)
+        if dataset.satellite is not None:
+            viewer = ApplicationWindow(dataset.satellite)
+        else:
+            viewer = ApplicationWindow(Satellite(**self.options))
+            viewer.start_load(str(dataset.path))
+        viewer.setWindowTitle("sbf viewer - {}".format(dataset.name()))
+        viewer.destroyed.connect(lambda *args, viewer=viewer: self.viewers.remove(viewer))
+        self.viewers.append(viewer)
+        viewer.show()
+
+    def closeEvent(self, ce):
+        self.pool.shutdown()
+        ce.accept()
+
+
+def run_compare(paths, options=None, workers=1):
+    matplotlib.use('Qt5Agg')
+    qApp = QtWidgets.QApplication(sys.argv)
+    cw = CompareWindow(paths, options, workers)
+    cw.show()
+    sys.exit(qApp.exec_())
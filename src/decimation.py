@@ -0,0 +1,83 @@
+import numpy as np
+
+from .signal_store import ColumnBuffer
+
+BUCKET = 4
+MIN_POINTS = 1024
+LEVEL_COLUMNS = (
+    ('x', np.float64),
+    ('y', np.float32)
+)
+
+
+class DecimationPyramid:
+    '''Levels of detail of a series for plotting
+
+    Level 0 is the raw series, every further level keeps the minimum and the
+    maximum sample of each bucket of BUCKET samples of the level below, at
+    their original x. CN0 dips and data gaps therefore stay visible at every
+    level. x has to be sorted.'''
+
+    def __init__(self, x, y):
+        self.base = (x, y)
+        self.levels = list()
+        self.done = list()
+        self.update(x, y)
+
+    def update(self, x, y):
+        '''x and y are the whole series so far, only the samples added since the last update are decimated
+
+        Samples of an incomplete bucket wait in the level below until it is full.'''
+        self.base = (x, y)
+        k = 0
+        while True:
+            x, y = self.level(k)
+            if k == len(self.levels):
+                if len(x) <= MIN_POINTS:
+                    break
+                self.levels.append(ColumnBuffer(LEVEL_COLUMNS, capacity=0))
+                self.done.append(0)
+            start = self.done[k]
+            stop = start + (len(x) - start) // BUCKET * BUCKET
+            if stop > start:
+                coarse_x, coarse_y = decimate(x[start:stop], y[start:stop])
+                self.levels[k].extend(x=coarse_x, y=coarse_y)
+                self.done[k] = stop
+            k += 1
+
+    def level(self, k):
+        if k == 0:
+            return self.base
+        return self.levels[k - 1]['x'], self.levels[k - 1]['y']
+
+    def tail(self, k):
+        '''Samples of the finer levels not yet in level k, they all lie after its last sample'''
+        x = np.concatenate([self.level(j)[0][self.done[j]:] for j in reversed(range(k))])
+        y = np.concatenate([self.level(j)[1][self.done[j]:] for j in reversed(range(k))])
+        return x, y
+
+    def select(self, x_min, x_max, max_points):
+        '''Returns the finest level with at most max_points samples in [x_min, x_max]
+
+        One sample beyond each end is included so lines reach the edges.'''
+        for k in range(len(self.levels) + 1):
+            x, y = self.level(k)
+            start = max(np.searchsorted(x, x_min) - 1, 0)
+            stop = np.searchsorted(x, x_max, 'right') + 1
+            if stop - start <= max_points:
+                break
+        if k == 0 or stop < len(x):
+            return x[start:stop], y[start:stop]
+        tail_x, tail_y = self.tail(k)
+        tail_stop = np.searchsorted(tail_x, x_max, 'right') + 1
+        return np.concatenate((x[start:], tail_x[:tail_stop])), np.concatenate((y[start:], tail_y[:tail_stop]))
+
+
+def decimate(x, y):
+    '''Keeps the minimum and the maximum of every bucket, len(y) has to be a multiple of BUCKET'''
+    buckets = y.reshape(-1, BUCKET)
+    offsets = np.arange(0, len(y), BUCKET)
+    keep = np.sort(np.stack((offsets + buckets.argmin(axis=1), offsets + buckets.argmax(axis=1)), axis=1), axis=1)
+    keep = keep.ravel()
+    keep = keep[np.append(True, np.diff(keep) > 0)]
+    return x[keep], y[keep]
@@ -0,0 +1,58 @@
+import numpy as np
+
+EVENT_SAMPLING = ('snap', 'nearest', 'interp')
+SNAP_MS = 100
+
+
+def series_key(series):
+    '''Flattens a list of (tow, values) series into one array sorted by (series, tow)
+
+    Returns the sort key series << 32 | tow and the values in the same order.'''
+    tow = np.concatenate([np.asarray(tow, dtype=np.int64) for tow, values in series])
+    values = np.concatenate([np.asarray(values, dtype=np.float64) for tow, values in series])
+    group = np.repeat(np.arange(len(series), dtype=np.int64), [len(tow) for tow, values in series])
+    key = group << 32 | tow
+    if np.any(np.diff(key) < 0):
+        order = np.argsort(key, kind='stable')
+        key, values = key[order], values[order]
+    return key, values
+
+
+def sample_events(key, values, n_series, events, mode='snap', tolerance=SNAP_MS):
+    '''Samples every series at every event with one searchsorted over all series
+
+    key and values as returned by series_key. mode is one of:
+      snap: the epoch at int(event/100)*100, as the receiver logs at 10 Hz
+      nearest: the closest epoch at most tolerance [ms] away
+      interp: linear interpolation between the neighbouring epochs, both
+              at most tolerance [ms] away
+    Returns an array of shape (n_series, n_events), NaN where no value was found.'''
+    if mode not in EVENT_SAMPLING:
+        raise ValueError('Unknown event sampling {}'.format(mode))
+    events = np.asarray(events, dtype=np.int64)
+    groups = np.arange(n_series, dtype=np.int64)[:, None]
+    if not key.size or not events.size:
+        return np.full((n_series, events.size), np.nan)
+    last = key.size - 1
+
+    if mode == 'snap':
+        query = groups << 32 | (events // SNAP_MS * SNAP_MS)
+        right = np.searchsorted(key, query)
+        r = np.minimum(right, last)
+        return np.where((right <= last) & (key[r] == query), values[r], np.nan)
+
+    right = np.searchsorted(key, groups << 32 | events)
+    r, l = np.minimum(right, last), np.maximum(right - 1, 0)
+    d_r = (key[r] & 0xffffffff) - events
+    d_l = events - (key[l] & 0xffffffff)
+    has_r = (right <= last) & (key[r] >> 32 == groups) & (d_r <= tolerance)
+    has_l = (right > 0) & (key[l] >> 32 == groups) & (d_l <= tolerance)
+
+    if mode == 'nearest':
+        use_l = has_l & (~has_r | (d_l <= d_r))
+        return np.where(use_l, values[l], np.where(has_r, values[r], np.nan))
+
+    exact = has_r & (d_r == 0)
+    weight = d_l / np.maximum(d_l + d_r, 1)
+    interp = values[l] + (values[r] - values[l]) * weight
+    return np.where(exact, values[r], np.where(has_l & has_r, interp, np.nan))
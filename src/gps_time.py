@@ -0,0 +1,38 @@
+import datetime
+
+import numpy as np
+
+GPS_EPOCH = datetime.datetime(1980, 1, 6)
+MS_PER_DAY = 86400000.0
+MS_PER_WEEK = 604800000
+
+
+def gps_days(wnc, tow):
+    '''Days since the GPS epoch of arrays of WNc [weeks] and TOW [ms]'''
+    return np.asarray(wnc, dtype=np.float64) * 7.0 + np.asarray(tow, dtype=np.float64) / MS_PER_DAY
+
+
+def gps_week_tow(days):
+    '''Inverse of gps_days: WNc [weeks] and TOW [ms] of days since the GPS epoch'''
+    days = np.asarray(days, dtype=np.float64)
+    wnc = np.floor(days / 7.0)
+    return wnc.astype(np.int64), (days - wnc * 7.0) * MS_PER_DAY
+
+
+def gps_ms(wnc, tow):
+    '''Milliseconds since the GPS epoch of arrays of WNc [weeks] and TOW [ms], as int64'''
+    return np.asarray(wnc, dtype=np.int64) * MS_PER_WEEK + np.asarray(tow, dtype=np.int64)
+
+
+def split_weeks(first, last):
+    '''Splits the intervals first[i] <= t <= last[i] [ms since the GPS epoch] where a week rolls over
+
+    Returns the WNc, first and last TOW [ms] of the parts, in order.'''
+    first, last = np.asarray(first, dtype=np.int64), np.asarray(last, dtype=np.int64)
+    week_first = first // MS_PER_WEEK
+    n_parts = last // MS_PER_WEEK - week_first + 1
+    interval = np.repeat(np.arange(first.size), n_parts)
+    wnc = week_first[interval] + np.arange(interval.size) - np.repeat(np.cumsum(n_parts) - n_parts, n_parts)
+    week_start = wnc * MS_PER_WEEK
+    return (wnc, np.maximum(first[interval], week_start) - week_start,
+            np.minimum(last[interval], week_start + MS_PER_WEEK - 1) - week_start)
@@ -1,10 +1,17 @@
 from __future__ import unicode_literals
-from .satellite import Satellite
+from .satellite import Satellite, LoadCancelled, BAND_THRESHOLDS
+from .gps_time import GPS_EPOCH, gps_week_tow
+from .decimation import DecimationPyramid
+from .sbf_stream import open_source
+from .sbf_decode import BlockStream, CHUNK_BYTES
+from .timings import format_timings
 from matplotlib.figure import Figure
 from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
 from matplotlib import dates as md
+from matplotlib.image import BboxImage
 from PyQt5 import QtCore, QtWidgets
 from numpy import mean, nan
+import numpy as np
 import sys
 import os
 import random
@@ -12,17 +19,17 @@ import matplotlib
 import datetime
 import calendar
 
-matplotlib.use('Qt5Agg')
-
 DEFAULT_VALUE = 'N/A'
+GPS_EPOCH_DATENUM = md.date2num(GPS_EPOCH)
+EVENT_ALPHA = 0.3
+LOD_POINTS_PER_PIXEL = 2
+PROGRESS_STEPS = 1000
+FOLLOW_FPS = 4
 
 class MplCanvas(FigureCanvas):
     """Ultimately, this is a QWidget (as well as a FigureCanvasAgg, etc.)."""
 
     def __init__(self, parent, sat, band, width, height, dpi):
-        self.datetimeformat = "%Y-%m-%d %H:%M:%S.%f"
-        self.epoch = datetime.datetime.strptime("1980-01-06 00:00:00.000", self.datetimeformat)
-
         self.fig = Figure(figsize=(width, height), dpi=dpi)
         self.axes = self.fig.add_subplot(111)
 
@@ -41,67 +48,202 @@ class MplCanvas(FigureCanvas):
 
 
 class DynamicMplCanvas(MplCanvas):
-    """A canvas that updates itself every second with a new plot."""
+    """A canvas keeping one artist per satellite and one artist for all events.
+
+    Events and means are drawn as animated overlays on top of a cached
+    background, so toggling them only blits instead of redrawing the plot."""
 
     def __init__(self, *args, **kwargs):
         MplCanvas.__init__(self, *args, **kwargs)
+        self.background = None
+        self.saving = False
+        self.mpl_connect('draw_event', self.on_draw)
 
     def compute_initial_figure(self, sat, band):
-        self.axes.xaxis_date()
-        dict_df = sat.dict_df[band]
-        for key in dict_df:
-            self.axes.plot_date(self.get_time(1, dict_df[key].index),
-                                dict_df[key],
-                                '.',
-                                markersize=4.5)
+        self.sat_lines = dict()
+        self.sat_lod = dict()
+        self.axes.callbacks.connect('xlim_changed', self.update_lod)
+        self.event_lines = BboxImage(self.axes.bbox, interpolation='nearest', animated=True)
+        self.axes.add_artist(self.event_lines)
+        self.event_x = np.empty(0)
+        self.mean_lines = list()
+        self.shown = None
 
+        self.axes.xaxis_date()
         self.axes.xaxis.set_major_formatter(md.DateFormatter("%H:%M:%S"))
         self.axes.set_ylabel("CNR [dB-Hz]")
+        self.axes.title.set_animated(True)
         self.fig.autofmt_xdate()
 
-        self.show_events(sat.events)
-        self.show_mean(sat, band)
+        self.update_figure(sat, band)
 
     def show_events(self, events):
-        for trig in events['tow']:
-            self.axes.axvline(x=self.get_time_s(1, trig), color='k', linewidth=0.5, alpha=0.3)
+        self.event_x = events.datenum(GPS_EPOCH_DATENUM)
+        self.update_event_image()
+
+    def update_event_image(self):
+        """Renders all event markers as one row of pixels spanning the axes
+
+        Each pixel column is darkened as if the events falling into it were
+        drawn as overlapping lines, so the cost does not depend on the event count."""
+        x_min, x_max = self.axes.get_xlim()
+        width = max(int(self.axes.bbox.width), 1)
+        column = np.floor((self.event_x - x_min) / max(x_max - x_min, 1e-12) * width).astype(np.int64)
+        counts = np.bincount(column[(column >= 0) & (column < width)], minlength=width)
+        rgba = np.zeros((1, width, 4), dtype=np.uint8)
+        rgba[..., 3] = np.round(255 * (1.0 - (1.0 - EVENT_ALPHA) ** counts))
+        self.event_lines.set_data(rgba)
 
     def show_mean(self, sat, band):
-        axes_xlim_r = self.axes.get_xlim()
-        len_val, val = sat.get_top_mean(band)
-        max_val = sat.get_max_mean(band)
-        self.axes.axhline(y=val, color='k', linewidth=1.0, linestyle='dashed', alpha=0.7)
-        self.axes.axhline(y=max_val, color='k', linewidth=1.0, linestyle='dashed', alpha=0.7)
-        if not max_val == DEFAULT_VALUE:
-            self.axes.set_title("Max: {:.2f}, mean of top {} sats: {:.2f}".format(
-                max_val, len_val, val), fontsize=10)
+        """Statistics of the whole file, or of the shown range once the user zoomed in"""
+        for line in self.mean_lines:
+            line.remove()
+        self.mean_lines = list()
+        self.axes.set_title('')
+        summary, label = sat.summaries[band], ''
+        window = self.shown_tow_range(sat)
+        if window is not None:
+            summary, label = sat.window_summary(band, *window), 'Shown range: '
+        if summary['n_sats']:
+            for y in (summary['top_mean'], summary['max']):
+                self.mean_lines.append(self.axes.axhline(y=y, color='k', linewidth=1.0, linestyle='dashed',
+                                                         alpha=0.7, animated=True,
+                                                         visible=self.axes.title.get_visible()))
+            best = BAND_THRESHOLDS[band][0]
+            self.axes.set_title("{}Max: {:.2f}, mean of top {} sats: {:.2f}, {} sats over {} dB-Hz".format(
+                label, summary['max'], summary['top_length'], summary['top_mean'], summary['n_over'][best], best),
+                fontsize=10)
+
+    def shown_tow_range(self, sat):
+        """TOW range [ms] of the x axis when zoomed in within one week, else None
+
+        Live data uses the file statistics, rebuilding the window index on every update would not keep up."""
+        if self.axes.get_autoscalex_on() or sat.running():
+            return None
+        (wnc_min, tow_min), (wnc_max, tow_max) = (gps_week_tow(x - GPS_EPOCH_DATENUM) for x in self.axes.get_xlim())
+        if wnc_min != wnc_max:
+            return None
+        return tow_min, tow_max
 
     def update_figure(self, sat, band):
-        dict_df = sat.dict_df[band]
-        self.axes.cla()
-        self.axes.xaxis_date()
-        for sat in dict_df:
-            self.axes.plot_date(self.get_time(1, dict_df[sat].index),
-                                dict_df[sat],
-                                '.',
-                                markersize=4.5)
-        self.axes.xaxis.set_major_formatter(md.DateFormatter("%H:%M:%S"))
-        self.axes.set_ylabel("CNR [dB-Hz]")
-        self.fig.autofmt_xdate()
+        """Replaces the plotted data, e.g. after a new file was loaded"""
+        for line in self.sat_lines.values():
+            line.remove()
+        self.sat_lines = dict()
+        self.sat_lod = dict()
+        self.axes.set_prop_cycle(None)
+        self.append_figure(sat, band, autoscale=True)
+
+    def append_figure(self, sat, band, autoscale=None):
+        """Adds the samples which arrived since the last call, the cost grows with the new samples only
+
+        The x range follows the data unless the user zoomed in."""
+        for key, columns in sat.band_series(band):
+            x, y = columns.datenum(GPS_EPOCH_DATENUM), columns['cn0']
+            if key in self.sat_lod:
+                self.sat_lod[key].update(x, y)
+            else:
+                self.sat_lod[key] = DecimationPyramid(x, y)
+                self.sat_lines[key], = self.axes.plot_date(x[:0], y[:0], '.', markersize=4.5)
+        if autoscale or (autoscale is None and self.axes.get_autoscalex_on()):
+            max_points = LOD_POINTS_PER_PIXEL * max(int(self.axes.bbox.width), 1)
+            for key, lod in self.sat_lod.items():
+                self.sat_lines[key].set_data(*lod.select(-np.inf, np.inf, max_points))
+            self.axes.relim()
+            self.axes.autoscale_view()
+        self.shown = None
+        self.update_lod(self.axes)
+
+        self.shown = (sat, band)
+        self.show_events(sat.events)
+        self.show_mean(sat, band)
 
-    def get_time(self, wnc, tow_list):
-        xc_dt = []
-        for tow in tow_list:
-            elapsed = datetime.timedelta(days=(wnc*7), seconds=(tow / 1000), milliseconds=(tow - (tow / 1000)*1000))
-            xc_str = datetime.datetime.strftime(self.epoch + elapsed, self.datetimeformat)
-            xc_dt.append(datetime.datetime.strptime(xc_str, "%Y-%m-%d %H:%M:%S.%f"))
-        return xc_dt
+    def update_lod(self, axes):
+        """Shows the finest level of detail with at most LOD_POINTS_PER_PIXEL samples per pixel in the current x range"""
+        x_min, x_max = axes.get_xlim()
+        max_points = LOD_POINTS_PER_PIXEL * max(int(axes.bbox.width), 1)
+        for key, lod in self.sat_lod.items():
+            self.sat_lines[key].set_data(*lod.select(x_min, x_max, max_points))
+        if self.shown is not None:
+            self.show_mean(*self.shown)
+
+    def set_overlays(self, events, means):
+        self.event_lines.set_visible(events)
+        self.axes.title.set_visible(means)
+        for line in self.mean_lines:
+            line.set_visible(means)
+
+    def overlays(self):
+        return [self.event_lines, self.axes.title] + self.mean_lines
+
+    def print_figure(self, *args, **kwargs):
+        """Saves the figure with the visible overlays drawn as part of it
+
+        Blitting is off meanwhile, the draw of the saved file may use another
+        canvas and renderer."""
+        overlays = self.overlays()
+        self.saving = True
+        for artist in overlays:
+            artist.set_animated(False)
+        try:
+            return FigureCanvas.print_figure(self, *args, **kwargs)
+        finally:
+            self.saving = False
+            for artist in overlays:
+                artist.set_animated(True)
+            self.draw_idle()
+
+    def on_draw(self, event):
+        if self.saving:
+            return
+        self.background = self.copy_from_bbox(self.fig.bbox)
+        self.update_event_image()
+        self.draw_overlays()
+
+    def draw_overlays(self):
+        for artist in self.overlays():
+            if artist.get_visible():
+                self.fig.draw_artist(artist)
+
+    def blit_overlays(self):
+        if self.background is None:
+            self.draw_idle()
+            return
+        self.restore_region(self.background)
+        self.draw_overlays()
+        self.blit(self.fig.bbox)
+
+
+class LoadThread(QtCore.QThread):
+    """Loads a file into a fresh Satellite, so the shown one stays untouched until it is done"""
+    progress = QtCore.pyqtSignal(int, int)
+    loaded = QtCore.pyqtSignal(object)
+    failed = QtCore.pyqtSignal(str)
+
+    def __init__(self, satellite, filename, parent=None):
+        QtCore.QThread.__init__(self, parent)
+        self.satellite = satellite
+        self.filename = filename
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
 
-    def get_time_s(self, wnc, tow):
-        elapsed = datetime.timedelta(days=(wnc*7), seconds=(tow / 1000), milliseconds=(tow - (tow / 1000)*1000))
-        xc_str = datetime.datetime.strftime(self.epoch + elapsed, self.datetimeformat)
-        xc_dt = datetime.datetime.strptime(xc_str, "%Y-%m-%d %H:%M:%S.%f")
-        return xc_dt
+    def report_progress(self, bytes_read, blocks):
+        if self.cancelled:
+            raise LoadCancelled()
+        self.progress.emit(bytes_read, blocks)
+
+    def run(self):
+        try:
+            self.satellite.load_file(self.filename, progress=self.report_progress)
+        except LoadCancelled:
+            return
+        except Exception as e:
+            self.failed.emit(str(e))
+            return
+        if not self.cancelled:
+            self.loaded.emit(self.satellite)
 
 
 class ApplicationWindow(QtWidgets.QMainWindow):
@@ -109,6 +251,10 @@ class ApplicationWindow(QtWidgets.QMainWindow):
         self.satellite = satellite
         self.enable_events = True
         self.enable_mean = True
+        self.load_thread = None
+        self.load_size = 1
+        self.follow_source = None
+        self.follow_stream = None
 
         QtWidgets.QMainWindow.__init__(self)
         self.setAttribute(QtCore.Qt.WA_DeleteOnClose)
@@ -121,6 +267,11 @@ class ApplicationWindow(QtWidgets.QMainWindow):
         self.file_menu = QtWidgets.QMenu(' &File', self)
         self.file_menu.addAction(' &Open file', self.load_file,
                                  QtCore.Qt.CTRL + QtCore.Qt.Key_O)
+        self.file_menu.addAction(' &Follow file', self.follow_file,
+                                 QtCore.Qt.CTRL + QtCore.Qt.Key_F)
+        self.file_menu.addAction(' &Stop following', self.stop_follow)
+        self.file_menu.addAction(' &Compare files', self.compare_files,
+                                 QtCore.Qt.CTRL + QtCore.Qt.Key_K)
         self.file_menu.addAction(' &Quit', self.fileQuit,
                                  QtCore.Qt.CTRL + QtCore.Qt.Key_Q)
         self.menuBar().addMenu(self.file_menu)
@@ -149,10 +300,28 @@ class ApplicationWindow(QtWidgets.QMainWindow):
         self.main_widget.setFocus()
         self.setCentralWidget(self.main_widget)
 
+        self.load_label = QtWidgets.QLabel(self)
+        self.load_progress = QtWidgets.QProgressBar(self)
+        self.load_progress.setRange(0, PROGRESS_STEPS)
+        self.load_cancel = QtWidgets.QPushButton('Cancel', self)
+        self.load_cancel.clicked.connect(self.cancel_load)
+        for widget in (self.load_label, self.load_progress, self.load_cancel):
+            self.statusBar().addPermanentWidget(widget)
+        self.show_load_progress(False)
+
+        self.follow_timer = QtCore.QTimer(self)
+        self.follow_timer.setInterval(1000 // FOLLOW_FPS)
+        self.follow_timer.timeout.connect(self.poll_follow)
+
     def fileQuit(self):
         self.close()
 
     def closeEvent(self, ce):
+        self.stop_follow()
+        self.cancel_load()
+        for thread in self.findChildren(LoadThread):
+            thread.cancel()
+            thread.wait()
         self.fileQuit()
 
     def about(self):
@@ -160,44 +329,163 @@ class ApplicationWindow(QtWidgets.QMainWindow):
 
     def load_file(self):
         filename = self.openFileNameDialog()
-        self.satellite.load_file(filename)
+        if filename:
+            self.start_load(filename)
+
+    def compare_files(self):
+        """Opens the selected files in a comparison window, see compare.CompareWindow"""
+        from .compare import CompareWindow
+        options = QtWidgets.QFileDialog.Options()
+        options |= QtWidgets.QFileDialog.DontUseNativeDialog
+        filenames, _ = QtWidgets.QFileDialog.getOpenFileNames(
+            self, "Compare files", "", "SBF files (*.sbf);;All Files (*)", options=options)
+        if not filenames:
+            return
+        self.compare_window = CompareWindow(filenames, {'event_sampling': self.satellite.event_sampling,
+                                                        'event_tolerance': self.satellite.event_tolerance,
+                                                        'signal_cache': self.satellite.signal_cache})
+        self.compare_window.show()
+
+    def start_load(self, filename):
+        """Loads filename on a worker thread, the current file stays on screen until it is done"""
+        self.stop_follow()
+        self.cancel_load()
+        satellite = Satellite(event_sampling=self.satellite.event_sampling,
+                              event_tolerance=self.satellite.event_tolerance,
+                              signal_cache=self.satellite.signal_cache,
+                              timings=self.satellite.timings_enabled)
+        self.load_thread = LoadThread(satellite, filename, self)
+        self.load_thread.progress.connect(self.on_load_progress)
+        self.load_thread.loaded.connect(self.on_loaded)
+        self.load_thread.failed.connect(self.on_load_failed)
+        self.load_thread.finished.connect(self.load_thread.deleteLater)
+        self.load_size = max(os.path.getsize(filename), 1) if os.path.isfile(filename) else 1
+        self.load_label.setText("Loading {}".format(os.path.basename(filename)))
+        self.load_progress.setValue(0)
+        self.show_load_progress(True)
+        self.load_thread.start()
+
+    def cancel_load(self):
+        if self.load_thread is not None:
+            self.load_thread.cancel()
+            self.load_thread = None
+            self.statusBar().showMessage("Loading cancelled", 3000)
+        self.show_load_progress(False)
+
+    def is_current_load(self):
+        """Signals of cancelled loads may still arrive and are ignored"""
+        return self.load_thread is not None and self.sender() is self.load_thread
+
+    def on_load_progress(self, bytes_read, blocks):
+        if not self.is_current_load():
+            return
+        self.load_progress.setValue(min(bytes_read * PROGRESS_STEPS // self.load_size, PROGRESS_STEPS))
+        self.load_progress.setFormat("{} blocks, %p%".format(blocks))
+
+    def on_loaded(self, satellite):
+        if not self.is_current_load():
+            return
+        self.load_thread = None
+        self.show_load_progress(False)
+
+        self.satellite = satellite
         self.dict_df = self.satellite.dict_df
         self.events = self.satellite.events
-        print("Loaded new file {}".format(filename))
+        print("Loaded new file {}".format(self.satellite.sbf_file))
+        if self.satellite.timings.enabled:
+            print(format_timings(self.satellite.timings.to_dict()))
 
         self.enable_events = True
         self.enable_mean = True
 
         self.update_view()
 
+    def on_load_failed(self, message):
+        if not self.is_current_load():
+            return
+        self.load_thread = None
+        self.show_load_progress(False)
+        print("Error: loading failed: {}".format(message))
+        self.statusBar().showMessage("Loading failed: {}".format(message), 5000)
+
+    def follow_file(self):
+        filename = self.openFileNameDialog()
+        if filename:
+            self.start_follow(filename)
+
+    def start_follow(self, spec):
+        """Shows a growing file or a tcp://host:port stream, new blocks are decoded at most FOLLOW_FPS times a second"""
+        self.stop_follow()
+        self.cancel_load()
+        try:
+            source = open_source(spec)
+        except (OSError, ValueError) as e:
+            print("Error: cannot follow {}: {}".format(spec, e))
+            return
+        satellite = Satellite(event_sampling='snap', event_tolerance=self.satellite.event_tolerance)
+        satellite.follow(source.name)
+        self.satellite = satellite
+        self.follow_source = source
+        self.follow_stream = BlockStream()
+        print("Following {}".format(source.name))
+        self.statusBar().showMessage("Following {}".format(source.name))
+        self.update_view()
+        self.follow_timer.start()
+
+    def stop_follow(self):
+        self.follow_timer.stop()
+        if self.follow_source is not None:
+            self.follow_source.close()
+            self.follow_source = None
+            self.statusBar().clearMessage()
+
+    def poll_follow(self):
+        try:
+            new = self.follow_source.read(CHUNK_BYTES)
+        except OSError as e:
+            print("Error: following {} failed: {}".format(self.follow_source.name, e))
+            self.stop_follow()
+            return
+        if not new:
+            return
+        data, index = self.follow_stream.feed(new)
+        if not len(index):
+            return
+        self.satellite.update(data, index)
+        for plot, band in ((self.top_plot, '1'), (self.bot_plot, '2')):
+            plot.append_figure(self.satellite, band)
+            plot.set_overlays(self.enable_events, self.enable_mean)
+            plot.draw_idle()
+
+    def show_load_progress(self, visible):
+        for widget in (self.load_label, self.load_progress, self.load_cancel):
+            widget.setVisible(visible)
+
     def toggle_events(self):
         if self.enable_events:
             self.enable_events = False
         else:
             self.enable_events = True
-        self.update_view()
+        self.update_overlays()
 
     def toggle_mean(self):
         if self.enable_mean:
             self.enable_mean = False
         else:
             self.enable_mean = True
-        self.update_view()
+        self.update_overlays()
 
     def update_view(self):
         self.top_plot.update_figure(self.satellite, '1')
         self.bot_plot.update_figure(self.satellite, '2')
+        for plot in (self.top_plot, self.bot_plot):
+            plot.set_overlays(self.enable_events, self.enable_mean)
+            plot.draw()
 
-        if self.enable_mean:
-            self.top_plot.show_mean(self.satellite, '1')
-            self.bot_plot.show_mean(self.satellite, '2')
-
-        if self.enable_events:
-            self.top_plot.show_events(self.satellite.events)
-            self.bot_plot.show_events(self.satellite.events)
-
-        self.top_plot.draw()
-        self.bot_plot.draw()
+    def update_overlays(self):
+        for plot in (self.top_plot, self.bot_plot):
+            plot.set_overlays(self.enable_events, self.enable_mean)
+            plot.blit_overlays()
 
     def openFileNameDialog(self):
         options = QtWidgets.QFileDialog.Options()
@@ -207,9 +495,14 @@ class ApplicationWindow(QtWidgets.QMainWindow):
         return filename
 
 
-def run_GUI(satellite):
+def run_GUI(satellite, follow=None, load=None):
+    matplotlib.use('Qt5Agg')
     qApp = QtWidgets.QApplication(sys.argv)
     aw = ApplicationWindow(satellite)
     aw.setWindowTitle("sbf viewer")
     aw.show()
+    if follow:
+        aw.start_follow(follow)
+    if load:
+        aw.start_load(load)
     sys.exit(qApp.exec_())
@@ -0,0 +1,87 @@
+import csv
+import math
+
+BATCH_ROWS = 1024
+EXPORT_FORMATS = ('parquet', 'feather')
+
+
+class ResultWriter:
+    '''Writes batch results row by row into a csv file with a fixed column order
+
+    Optionally the rows are also written to a parquet or feather file, in
+    batches of BATCH_ROWS rows.'''
+
+    def __init__(self, csv_file, columns, export=None):
+        self.columns = list(columns)
+        self.export = ArrowExport(csv_file.with_suffix('.' + export), self.columns, export) if export else None
+        self.csv_fobj = csv_file.open('w', newline='')
+        self.csv_writer = csv.writer(self.csv_fobj, lineterminator='\n')
+        self.csv_writer.writerow([''] + self.columns)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def write(self, idx, values):
+        self.csv_writer.writerow([idx] + [to_csv(values.get(col)) for col in self.columns])
+        if self.export is not None:
+            self.export.write(idx, values)
+
+    def close(self):
+        self.csv_fobj.close()
+        if self.export is not None:
+            self.export.close()
+
+
+class ArrowExport:
+    def __init__(self, path, columns, export):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError('pyarrow is required to export batch results as {}'.format(export))
+
+        self.pa = pa
+        self.columns = columns
+        self.schema = pa.schema([('file', pa.string())] + [(col, pa.float64()) for col in columns])
+        if export == 'parquet':
+            self.writer = pq.ParquetWriter(str(path), self.schema)
+        else:
+            self.writer = pa.ipc.new_file(str(path), self.schema)
+        self.rows = list()
+
+    def write(self, idx, values):
+        self.rows.append([idx] + [to_float(values.get(col)) for col in self.columns])
+        if len(self.rows) >= BATCH_ROWS:
+            self.flush()
+
+    def flush(self):
+        if not self.rows:
+            return
+        arrays = [self.pa.array(column, type=field.type) for column, field in zip(zip(*self.rows), self.schema)]
+        batch = self.pa.RecordBatch.from_arrays(arrays, schema=self.schema)
+        self.rows = list()
+        if hasattr(self.writer, 'write_batch'):
+            self.writer.write_batch(batch)
+        else:
+            self.writer.write_table(self.pa.Table.from_batches([batch]))
+
+    def close(self):
+        self.flush()
+        self.writer.close()
+
+
+def to_csv(value):
+    value = value.item() if hasattr(value, 'item') else value
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return ''
+    return value
+
+
+def to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return float('nan')
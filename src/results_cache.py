@@ -0,0 +1,102 @@
+import hashlib
+import json
+import os
+
+from pathlib import Path
+
+CACHE_FILE = '.ppk_quality_cache.json'
+WINDOWS_CACHE_FILE = '.ppk_quality_windows_cache.json'
+HEADER_BYTES = 65536
+
+
+class ResultsCache:
+    '''Per-file check() results of a batch directory, persisted as json
+
+    An entry is reused while the file size, mtime, a hash of the first
+    HEADER_BYTES of the file and the check settings are unchanged. With
+    windows, the window spec of a run, the window rows of every file are
+    kept column by column in WINDOWS_CACHE_FILE, so the results cache stays
+    small and stays valid for runs with other or no windows. An entry is
+    then only reused together with rows of the same spec.'''
+
+    def __init__(self, directory, settings, windows=None):
+        self.path = Path(directory) / CACHE_FILE
+        self.windows_path = Path(directory) / WINDOWS_CACHE_FILE if windows is not None else None
+        self.window_spec = windows
+        self.settings = settings_hash(settings)
+        self.entries = load(self.path)
+        self.windows = load(self.windows_path) if windows is not None else dict()
+        self.keys = dict()
+        self.seen = set()
+
+    def get(self, file):
+        idx = str(file)
+        self.seen.add(idx)
+        key = self.keys[idx] = file_key(file, self.settings)
+        entry = self.entries.get(idx)
+        if entry is None or entry['key'] != key:
+            return None
+        if self.windows_path is not None:
+            windows = self.windows.get(idx, {})
+            if windows.get('key') != key or windows.get('windows') != self.window_spec:
+                return None
+        return entry['values']
+
+    def get_windows(self, file):
+        '''Window rows stored with the values get() just returned for file, if any'''
+        entry = self.windows.get(str(file))
+        if entry is None:
+            return None
+        columns = entry['columns']
+        return [dict(zip(columns, row)) for row in zip(*columns.values())]
+
+    def put(self, idx, values, windows=None):
+        key = self.keys.pop(idx, None)
+        if key is None:
+            return
+        self.entries[idx] = {'key': key, 'values': {col: to_json(val) for col, val in values.items()}}
+        if windows is not None and self.windows_path is not None:
+            columns = {col: [to_json(row[col]) for row in windows] for col in (windows[0] if windows else ())}
+            self.windows[idx] = {'key': key, 'windows': self.window_spec, 'columns': columns}
+
+    def save(self):
+        '''Writes all entries of files seen in this run, dropping deleted files'''
+        save(self.path, {idx: entry for idx, entry in self.entries.items() if idx in self.seen})
+        if self.windows_path is not None:
+            save(self.windows_path, {idx: entry for idx, entry in self.windows.items() if idx in self.seen})
+
+
+def load(path):
+    if not path.is_file():
+        return dict()
+    try:
+        with path.open() as cache_fobj:
+            return json.load(cache_fobj)
+    except (OSError, ValueError):
+        print('Warning: Ignoring unreadable cache {}'.format(str(path)))
+        return dict()
+
+
+def save(path, entries):
+    tmp_path = path.with_name(path.name + '.tmp')
+    try:
+        with tmp_path.open('w') as cache_fobj:
+            json.dump(entries, cache_fobj)
+        os.replace(str(tmp_path), str(path))
+    except OSError as e:
+        print('Warning: Could not write cache {}: {}'.format(str(path), e))
+
+
+def file_key(file, settings):
+    stat = os.stat(str(file))
+    with open(str(file), 'rb') as sbf_fobj:
+        header = hashlib.sha1(sbf_fobj.read(HEADER_BYTES)).hexdigest()
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'header': header, 'settings': settings}
+
+
+def settings_hash(settings):
+    return hashlib.sha1(json.dumps(settings, sort_keys=True).encode()).hexdigest()
+
+
+def to_json(value):
+    return value.item() if hasattr(value, 'item') else value
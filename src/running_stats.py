@@ -0,0 +1,84 @@
+import numpy as np
+
+from .event_sampling import SNAP_MS
+
+# Fields of the per-satellite aggregates
+COUNT, SUM, EVENT_COUNT, EVENT_SUM = range(4)
+
+
+class RunningStats:
+    '''Per-satellite CN0 and per-frontend gain aggregates, updated chunk by chunk
+
+    Rows and events are kept by TOW, whatever the chunk sizes: rows down to
+    SNAP_MS before the newest epoch, so an ExtEvent logged after its
+    measurement epoch is still sampled, and events whose epoch has not been
+    seen yet. Every event is matched against every row exactly once.'''
+
+    def __init__(self):
+        self.groups = dict()
+        self.gains = dict()
+        self.rows = list()
+        self.events = list()
+        self.kept_rows = empty_rows()
+        self.waiting_events = np.empty(0, dtype=np.uint32)
+        self.newest_tow = None
+
+    def update_signals(self, tow, sig_num, svid, cn0):
+        key = np.asarray(sig_num, dtype=np.uint16) << 8 | np.asarray(svid, dtype=np.uint16)
+        cn0 = np.asarray(cn0, dtype=np.float64)
+        self.rows.append((tow, key, cn0))
+        self.accumulate(self.groups, key, np.ones(key.size), cn0, COUNT)
+
+    def update_events(self, tow):
+        self.events.append(tow // SNAP_MS * SNAP_MS)
+
+    def update_gain(self, sig_num, gain):
+        self.accumulate(self.gains, sig_num, np.ones(len(sig_num)), np.asarray(gain, dtype=np.float64), COUNT)
+
+    def step(self):
+        '''Samples the events at the end of a chunk and drops the rows and events no later one can match'''
+        rows = concat_rows(self.rows)
+        events = np.concatenate([np.empty(0, dtype=np.uint32)] + self.events)
+        self.match(np.concatenate((self.waiting_events, events)), rows)
+        self.match(events, self.kept_rows)
+        self.rows, self.events = list(), list()
+
+        if rows[0].size:
+            self.newest_tow = int(rows[0].max())
+        rows = tuple(np.concatenate(column) for column in zip(self.kept_rows, rows))
+        events = np.concatenate((self.waiting_events, events))
+        if self.newest_tow is not None:
+            rows = tuple(column[rows[0] >= self.newest_tow - SNAP_MS] for column in rows)
+            events = events[events >= self.newest_tow]
+        self.kept_rows, self.waiting_events = rows, events
+
+    def match(self, targets, rows):
+        tow, key, cn0 = rows
+        if not targets.size or not tow.size:
+            return
+        targets = np.sort(targets)
+        hits = np.searchsorted(targets, tow, 'right') - np.searchsorted(targets, tow, 'left')
+        found = hits > 0
+        self.accumulate(self.groups, key[found], hits[found], cn0[found] * hits[found], EVENT_COUNT)
+
+    def accumulate(self, aggregates, key, counts, sums, field):
+        if not len(key):
+            return
+        keys, inverse = np.unique(key, return_inverse=True)
+        counts = np.bincount(inverse, weights=counts, minlength=keys.size)
+        sums = np.bincount(inverse, weights=sums, minlength=keys.size)
+        for key, count, total in zip(keys.tolist(), counts.tolist(), sums.tolist()):
+            if key not in aggregates:
+                aggregates[key] = [0, 0.0, 0, 0.0]
+            aggregates[key][field] += int(count)
+            aggregates[key][field + 1] += total
+
+
+def empty_rows():
+    return np.empty(0, dtype=np.uint32), np.empty(0, dtype=np.uint16), np.empty(0, dtype=np.float64)
+
+
+def concat_rows(rows):
+    if not rows:
+        return empty_rows()
+    return tuple(np.concatenate(column) for column in zip(*rows))
@@ -1,25 +1,134 @@
 import logging
-
-import pandas as pd
 import time
 
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
 from pathlib import Path
-from .satellite import Satellite
+from .result_writer import ResultWriter
+from .results_cache import ResultsCache
+from .satellite import Satellite, WINDOW_COLUMNS
+from .timings import STAGES, TOTAL_COLUMN, stage_column, timing_columns
+
+QUEUE_DEPTH = 4
 
-def run(directory):
-    satellite = Satellite()
+def run(directory, jobs=1, use_cache=True, export=None, options=None, windows=None):
+    '''options are passed as keyword arguments to Satellite
+
+    With options['timings'] the stage timings of every processed file are
+    written to ppk_quality_timings.csv. With windows, a window length [s] or
+    'events', the statistics of every window are written to
+    ppk_quality_windows.csv, see Satellite.window_rows.'''
+    options = options or dict()
+    satellite = Satellite(**options)
     current_directory = get_valid_directory(directory)
-    data = pd.DataFrame()
+    settings = satellite.check_settings()
+    cache = ResultsCache(current_directory, settings, windows) if use_cache else None
+    csv_file = current_directory / Path('ppk_quality_output.csv')
+    timings_file = current_directory / Path('ppk_quality_timings.csv')
+    windows_file = current_directory / Path('ppk_quality_windows.csv')
     files = log_files(current_directory)
+    failed = list()
+    totals = dict.fromkeys(STAGES, 0.0)
     starttime = time.time()
-    for file in files:
-        print('Processing {}'.format(str(file)))
-        satellite.load_file(file)
-        idx, values = satellite.check()
-        data = data.append(pd.DataFrame(data=values, index=[idx]), sort=True)
+    with ResultWriter(csv_file, sorted(satellite.check_columns()), export) as writer, \
+            timing_writer(timings_file, options.get('timings')) as timings_writer, \
+            optional_writer(windows_file, WINDOW_COLUMNS, windows is not None) as windows_writer:
+        for idx, values, timings, window_rows in process_files(files, jobs, cache, options, windows):
+            if values is None:
+                failed.append(idx)
+                continue
+            if cache is not None:
+                cache.put(idx, values, window_rows)
+            start = time.perf_counter()
+            writer.write(idx, values)
+            for row in window_rows or ():
+                windows_writer.write(idx, row)
+            if timings is not None and timings_writer is not None:
+                timings[stage_column('csv write')] = time.perf_counter() - start
+                timings[TOTAL_COLUMN] = sum(timings[stage_column(stage)] for stage in STAGES)
+                timings_writer.write(idx, timings)
+                for stage in STAGES:
+                    totals[stage] += timings[stage_column(stage)]
     print('Processed files in {:.2f} s'.format(time.time()-starttime))
-    csv_file = current_directory / Path('ppk_quality_output.csv')
-    data.to_csv(csv_file)
+    if options.get('timings'):
+        print_totals(totals, timings_file)
+    if cache is not None:
+        cache.save()
+    for idx in failed:
+        print('Error: Failed to process {}'.format(idx))
+
+def timing_writer(timings_file, enabled):
+    return optional_writer(timings_file, timing_columns(), enabled)
+
+@contextmanager
+def optional_writer(csv_file, columns, enabled):
+    if enabled:
+        with ResultWriter(csv_file, columns) as writer:
+            yield writer
+    else:
+        yield None
+
+def print_totals(totals, timings_file):
+    print('Time per stage over all processed files, per file in {}:'.format(timings_file))
+    for stage, seconds in sorted(totals.items(), key=lambda item: -item[1]):
+        if seconds:
+            print('  {:<26}{:8.3f} s'.format(stage, seconds))
+
+def process_files(files, jobs=1, cache=None, options=None, windows=None):
+    '''Yields the check() results, stage timings and window rows of files in order
+
+    Results found in cache are reused, the others are computed in a pool of
+    jobs processes if jobs > 1. If a worker process dies, the files waiting
+    in the pool are reported as failed and the remaining ones are processed
+    serially.'''
+    with process_pool(jobs) as executor:
+        queue = deque()
+        for file in files:
+            values = cache.get(file) if cache is not None else None
+            if values is not None:
+                queue.append((file, (str(file), values, None, cache.get_windows(file))))
+            elif executor is not None:
+                try:
+                    queue.append((file, executor.submit(process_file, file, options, windows)))
+                except BrokenProcessPool:
+                    print('Error: A worker process died, processing the remaining files serially')
+                    executor = None
+            if values is None and executor is None:
+                queue.append((file, process_file(file, options, windows)))
+            while len(queue) > jobs * QUEUE_DEPTH:
+                yield get_result(*queue.popleft())
+        while queue:
+            yield get_result(*queue.popleft())
+
+@contextmanager
+def process_pool(jobs):
+    if jobs > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            yield executor
+    else:
+        yield None
+
+def get_result(file, item):
+    if not isinstance(item, Future):
+        return item
+    try:
+        return item.result()
+    except BrokenProcessPool as e:
+        print('Error: Processing {} failed: {!r}'.format(str(file), e))
+        return str(file), None, None, None
+
+def process_file(file, options=None, windows=None):
+    print('Processing {}'.format(str(file)))
+    try:
+        satellite = Satellite(file, **(options or dict()))
+        idx, values = satellite.check()
+        window_rows = satellite.window_rows(windows) if windows is not None else None
+        return idx, values, satellite.timings.to_dict() if satellite.timings.enabled else None, window_rows
+    except Exception as e:
+        print('Error: Processing {} failed: {!r}'.format(str(file), e))
+        return str(file), None, None, None
 
 def log_files(directory):
     extensions = ['*.sbf']
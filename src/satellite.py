@@ -1,10 +1,18 @@
-from pysbf import sbf
 from pathlib import Path
-from numpy import mean
-from .sbf_map import sig_num_ref, gain_num_ref
+from .sbf_map import sig_num_ref, gain_num_ref, svid_ref
+from .event_sampling import EVENT_SAMPLING, SNAP_MS
+from .gps_time import gps_ms, split_weeks
+from .running_stats import RunningStats
+from .window_stats import WindowIndex
+from . import band_statistics
+from .signal_store import SignalStore, ColumnBuffer, SERIES_COLUMNS, EVENT_COLUMNS, GAIN_COLUMNS
+from .signal_cache import stat_key, pack, unpack
+from .timings import Timings
+from .sbf_index import SbfFile
+from . import sbf_decode
 
+import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
 
 DEFAULT_VALUE = 'N/A'
 MIN_LENGTH = 7
@@ -12,187 +20,451 @@ BEST_L1 = 43
 GOOD_L1 = 40
 BEST_L2 = 36
 GOOD_L2 = 30
+BAND_THRESHOLDS = {'1': (BEST_L1, GOOD_L1), '2': (BEST_L2, GOOD_L2)}
+CHUNK_BLOCKS = 10000
+WINDOW_EVENTS = 'events'
+WINDOW_CHUNK = 4096
+GAIN_COLUMN = 'Frontend gain avg: {}'
+CHECK_COLUMNS = [
+    'Best sat. L1 [dB-Hz]',
+    'Best sat. L2 [dB-Hz]',
+    'Avg. of top L1 sat. [dB-Hz]',
+    'Len. of top L1 sat. [ ]',
+    'Avg. of top L2 sat. [dB-Hz]',
+    'Len. of top L2 sat. [ ]',
+    'Inop: n sat. over {} dB-Hz L1 []'.format(BEST_L1),
+    'Inop: n sat. over {} dB-Hz L1 []'.format(GOOD_L1),
+    'Inop: n sat. over {} dB-Hz L2 []'.format(BEST_L2),
+    'Inop: n sat. over {} dB-Hz L2 []'.format(GOOD_L2),
+    'Num. of ExtEvent',
+    'Mission duration [min]'
+]
+WINDOW_COLUMNS = [
+    'Window',
+    'WNc [weeks]',
+    'First TOW [ms]',
+    'Last TOW [ms]',
+    'Band',
+    'Num. of sat. [ ]',
+    'Best sat. [dB-Hz]',
+    'Avg. of top sat. [dB-Hz]',
+    'Len. of top sat. [ ]',
+    'Best threshold [dB-Hz]',
+    'n sat. over best threshold [ ]',
+    'Good threshold [dB-Hz]',
+    'n sat. over good threshold [ ]',
+    'Num. of ExtEvent'
+]
+
+
+class LoadCancelled(Exception):
+    '''Raised by a progress callback to abort Satellite.load_file'''
 
 
 class Satellite:
-    def __init__(self, sbf_file=None):
+    def __init__(self, sbf_file=None, streaming=False, event_sampling='snap', event_tolerance=SNAP_MS,
+                 signal_cache=None, timings=False):
+        '''In streaming mode only running aggregates are kept, which is enough for check()
+
+        event_sampling selects how CN0 is sampled at ExtEvents, see event_sampling.sample_events
+        signal_cache is a SignalCache holding the decoded signals and block indexes of files loaded before
+        timings enables the per-stage timings of every load in self.timings'''
+        if event_sampling not in EVENT_SAMPLING:
+            raise ValueError('Unknown event sampling {}'.format(event_sampling))
+        if streaming and event_sampling != 'snap':
+            raise ValueError('Streaming mode only supports snap event sampling')
         self.sig_num_ref = sig_num_ref
         self.gain_num_ref = gain_num_ref
+        self.streaming = streaming
+        self.following = False
+        self.event_sampling = event_sampling
+        self.event_tolerance = event_tolerance
+        self.signal_cache = signal_cache
+        self.timings_enabled = timings
         if sbf_file:
             self.load_file(sbf_file)
+        else:
+            self.reset('')
+
+    def load_file(self, sbf_file, tow_range=None, progress=None):
+        '''tow_range = (first, last) [ms] restricts a full load to the blocks in that range
+
+        progress(bytes_read, blocks_decoded) is called after every chunk of
+        blocks, it may raise LoadCancelled to abort the load. If the block index
+        has to be built first, its scan reports the first half of the file size
+        and the decoding the second. A file without any block with a valid CRC
+        raises ValueError.'''
+        if self.streaming and tow_range is not None:
+            raise ValueError('tow_range is not supported in streaming mode')
+        self.reset(sbf_file)
+        use_cache = self.signal_cache is not None and not self.streaming and tow_range is None \
+            and self.sbf_file.is_file()
+        with self.timings.stage('cache'):
+            cached = self.signal_cache.get(self.sbf_file, self.cache_settings()) if use_cache else None
+
+        # Process file
+        if self.sbf_file.is_file():
+            self.timings.bytes = self.sbf_file.stat().st_size
+        if cached is not None:
+            self.from_cache_arrays(cached)
+            if progress is not None:
+                progress(self.timings.bytes, self.n_blocks)
+        elif self.sbf_file.is_file() and self.streaming:
+            n_found = 0
+            with self.sbf_file.open('rb') as sbf_fobj:
+                chunks = sbf_decode.read_chunks(sbf_fobj)
+                while True:
+                    with self.timings.stage('read'):
+                        chunk = next(chunks, None)
+                    if chunk is None:
+                        break
+                    data, index = chunk
+                    n_found += len(index)
+                    self.decode_blocks(data, index[np.isin(index['id'], sbf_decode.DECODED_BLOCKS)], progress,
+                                       sbf_fobj.tell() - data.size)
+            if not n_found:
+                raise ValueError('{} contains no valid SBF blocks'.format(self.sbf_file))
+        elif self.sbf_file.is_file():
+            stat = stat_key(self.sbf_file)
+            size = self.timings.bytes
+            scan_progress = None if progress is None else lambda pos: progress(pos // 2, 0)
+            with self.timings.stage('index'):
+                sbf = SbfFile(self.sbf_file, self.signal_cache, scan_progress)
+            decode_progress = progress
+            if progress is not None and sbf.built:
+                decode_progress = lambda pos, blocks: progress((size + pos) // 2, blocks)
+            with sbf:
+                if not len(sbf.index):
+                    raise ValueError('{} contains no valid SBF blocks'.format(self.sbf_file))
+                self.decode_blocks(sbf.data, sbf.select(sbf_decode.DECODED_BLOCKS, tow_range), decode_progress)
+            if use_cache:
+                with self.timings.stage('cache'):
+                    self.signal_cache.put(self.sbf_file, self.cache_settings(), stat, self.to_cache_arrays())
+        self.signals.finalize()
+        self.timings.blocks = self.n_blocks
+        with self.timings.stage('dataframes'):
+            self.to_dict_df()
+        with self.timings.stage('statistics'):
+            self.update_statistics()
+
+    def cache_settings(self):
+        '''Settings which change what is decoded, entries of the signal cache depend on them'''
+        return {
+            'sig_num_en': sorted(self.enabled_sig_nums()),
+            'gain_num_en': [num for num, ref in self.gain_num_ref.items() if ref['en']]
+        }
+
+    def to_cache_arrays(self):
+        arrays = {'info': np.array([self.mission_min_tow, self.mission_max_tow, self.n_ext_events, self.n_blocks],
+                                   dtype=np.float64)}
+        arrays.update(pack('signals', self.signals.groups, SERIES_COLUMNS))
+        arrays.update(pack('gains', self.gain_signals, GAIN_COLUMNS))
+        arrays.update(pack('events', {0: self.events}, EVENT_COLUMNS))
+        return arrays
 
-    def load_file(self, sbf_file):
+    def from_cache_arrays(self, arrays):
+        self.mission_min_tow, self.mission_max_tow, n_ext_events, n_blocks = arrays['info'].tolist()
+        self.n_ext_events, self.n_blocks = int(n_ext_events), int(n_blocks)
+        self.signals.groups = unpack(arrays, 'signals', SERIES_COLUMNS)
+        self.gain_signals = unpack(arrays, 'gains', GAIN_COLUMNS)
+        self.events = unpack(arrays, 'events', EVENT_COLUMNS)[0]
+
+    def follow(self, source_name):
+        '''Starts an empty data set which is then extended by update() as blocks arrive
+
+        Means come from running aggregates, so every update costs time
+        proportional to the new blocks only. dict_df is not kept up to date.'''
+        if self.event_sampling != 'snap':
+            raise ValueError('Follow mode only supports snap event sampling')
+        self.reset(source_name)
+        self.following = True
+
+    def update(self, data, index):
+        '''Decodes the newly arrived blocks of index into the series and statistics'''
+        self.decode_blocks(data, index[np.isin(index['id'], sbf_decode.DECODED_BLOCKS)])
+        self.update_statistics()
+
+    def running(self):
+        '''Whether the statistics come from the running aggregates instead of the stored series'''
+        return self.streaming or self.following
+
+    def reset(self, sbf_file):
         # Reset all counters
-        self.signals = dict()
+        self.signals = SignalStore()
         self.gain_signals = dict()
-        self.events = {'tow': list()}
+        self.events = ColumnBuffer(EVENT_COLUMNS)
+        self.running_stats = RunningStats()
         self.dict_df = {'1': dict(), '2': dict()}
-        self.means = {'1': list(), '2': list()}
+        self.sat_stats = pd.DataFrame(columns=band_statistics.SAT_COLUMNS)
+        self.gain_stats = pd.DataFrame(columns=band_statistics.GAIN_STAT_COLUMNS)
+        self.summaries = {band: band_statistics.band_summary(self.sat_stats, band, MIN_LENGTH, BAND_THRESHOLDS[band])
+                          for band in BAND_THRESHOLDS}
+        self.window_index = None
         self.mission_min_tow = 0.0
         self.mission_max_tow = 0.0
         self.n_ext_events = 0
+        self.n_blocks = 0
+        self.sbf_file = Path(sbf_file)
+        self.following = False
+        self.timings = Timings(self.timings_enabled)
 
+    def decode_blocks(self, data, index, progress=None, data_offset=0):
+        '''data_offset is the file position of data[0], only used for progress reports
 
-        # Process file
-        self.sbf_file = Path(sbf_file)
-        if self.sbf_file.is_file():
-            with self.sbf_file.open() as sbf_fobj:
-                for blockName, block in sbf.load(sbf_fobj, blocknames={'MeasEpoch_v2', 'ExtEvent', 'ReceiverStatus_v2'}):
-                    if blockName == 'MeasEpoch_v2':
-                        for meas in block['Type_1']:
-                            self.update_signals(block['TOW'], block['WNc'], meas['SVID'],
-                                                meas['Type'], meas['CN0'], meas['LockTime'])
-                            for nested_entry in meas['Type_2']:
-                                self.update_signals(block['TOW'], block['WNc'], meas['SVID'],
-                                                    nested_entry['Type'], nested_entry['CN0'], nested_entry['LockTime'])
-
-                    elif blockName == 'ExtEvent':
-                        self.update_events(block['TOW'], block['WNc'])
-                        self.n_ext_events = self.n_ext_events + 1
-                    elif blockName == 'ReceiverStatus_v2':
-                        for meas in block['AGCData']:
-                            self.update_gain(block['TOW'], block['WNc'], meas['FrontendID'], meas['Gain'])
-        self.to_dict_df()
-        self.update_sorted_mean_list(band='1')
-        self.update_sorted_mean_list(band='2')
+        Only measurements of enabled signals are decoded.'''
+        sig_nums = self.enabled_sig_nums()
+        for start in range(0, len(index), CHUNK_BLOCKS):
+            chunk = index[start:start + CHUNK_BLOCKS]
+            meas = chunk[chunk['id'] == sbf_decode.MEAS_EPOCH_V2]
+            with self.timings.stage('decode MeasEpoch_v2'):
+                epoch_tow = sbf_decode.meas_epoch_tow(data, meas['offset'])
+                signals = sbf_decode.decode_meas_epoch(data, meas['offset'], meas['length'], sig_nums)
+            with self.timings.stage('signals'):
+                self.update_mission(epoch_tow)
+                self.update_signals(**signals)
+            ext_events = chunk['offset'][chunk['id'] == sbf_decode.EXT_EVENT]
+            with self.timings.stage('decode ExtEvent'):
+                events = sbf_decode.decode_ext_event(data, ext_events)
+            with self.timings.stage('events'):
+                self.update_events(**events)
+            status = chunk['offset'][chunk['id'] == sbf_decode.RECEIVER_STATUS_V2]
+            with self.timings.stage('decode ReceiverStatus_v2'):
+                gain = sbf_decode.decode_receiver_status(data, status)
+            with self.timings.stage('gain'):
+                self.update_gain(**gain)
+            if self.running():
+                with self.timings.stage('running stats'):
+                    self.running_stats.step()
+            self.n_blocks += len(chunk)
+            if progress is not None:
+                progress(data_offset + int(chunk['offset'][-1]) + int(chunk['length'][-1]), self.n_blocks)
 
     def check(self):
-        len_top_1, val_top_1 = self.get_top_mean('1')
-        len_top_2, val_top_2 = self.get_top_mean('2')
+        l1, l2 = self.summaries['1'], self.summaries['2']
         checks = {
             'Best sat. L1 [dB-Hz]': self.get_max_mean('1'),
             'Best sat. L2 [dB-Hz]': self.get_max_mean('2'),
-            'Avg. of top L1 sat. [dB-Hz]': val_top_1,
-            'Len. of top L1 sat. [ ]': len_top_1,
-            'Avg. of top L2 sat. [dB-Hz]': val_top_2,
-            'Len. of top L2 sat. [ ]': len_top_2,
-            'Inop: n sat. over {} dB-Hz L1 []'.format(BEST_L1): self.get_n_thresh('1', BEST_L1),
-            'Inop: n sat. over {} dB-Hz L1 []'.format(GOOD_L1): self.get_n_thresh('1', GOOD_L1),
-            'Inop: n sat. over {} dB-Hz L2 []'.format(BEST_L2): self.get_n_thresh('2', BEST_L2),
-            'Inop: n sat. over {} dB-Hz L2 []'.format(GOOD_L2): self.get_n_thresh('2', GOOD_L2),
+            'Avg. of top L1 sat. [dB-Hz]': l1['top_mean'],
+            'Len. of top L1 sat. [ ]': l1['top_length'],
+            'Avg. of top L2 sat. [dB-Hz]': l2['top_mean'],
+            'Len. of top L2 sat. [ ]': l2['top_length'],
+            'Inop: n sat. over {} dB-Hz L1 []'.format(BEST_L1): l1['n_over'][BEST_L1],
+            'Inop: n sat. over {} dB-Hz L1 []'.format(GOOD_L1): l1['n_over'][GOOD_L1],
+            'Inop: n sat. over {} dB-Hz L2 []'.format(BEST_L2): l2['n_over'][BEST_L2],
+            'Inop: n sat. over {} dB-Hz L2 []'.format(GOOD_L2): l2['n_over'][GOOD_L2],
             'Num. of ExtEvent': self.n_ext_events,
             'Mission duration [min]': self.get_mission_duration()
         }
         checks = self.checks_gain(checks)
         return str(self.sbf_file), checks
 
+    def check_columns(self):
+        '''All columns check() can return, whichever file is loaded'''
+        return CHECK_COLUMNS + [GAIN_COLUMN.format(ref['sig_type']) for ref in self.gain_num_ref.values() if ref['en']]
+
+    def check_settings(self):
+        '''Everything besides the file content which check() output depends on'''
+        return {
+            'MIN_LENGTH': MIN_LENGTH,
+            'BEST_L1': BEST_L1,
+            'GOOD_L1': GOOD_L1,
+            'BEST_L2': BEST_L2,
+            'GOOD_L2': GOOD_L2,
+            'sig_num_en': [num for num, ref in self.sig_num_ref.items() if ref['en']],
+            'gain_num_en': [num for num, ref in self.gain_num_ref.items() if ref['en']],
+            'event_sampling': self.event_sampling,
+            'event_tolerance': self.event_tolerance
+        }
+
     def checks_gain(self, checks):
-        for sig_num in self.gain_signals.keys():
-            col_str = 'Frontend gain avg: {}'.format(self.gain_num_ref[sig_num]['sig_type'])
-            checks[col_str] = mean(self.gain_signals[sig_num]['gain'])
+        for sig_num, gain in zip(self.gain_stats['sig_num'].tolist(), self.gain_stats['mean'].tolist()):
+            col_str = GAIN_COLUMN.format(self.gain_num_ref[sig_num]['sig_type'])
+            checks[col_str] = gain
         return checks
 
+    def update_statistics(self):
+        '''Rebuilds the per-satellite and per-frontend tables and the band summaries check() and the GUI read
+
+        Without stored series, i.e. when running(), the tables come from the running aggregates.'''
+        self.window_index = None
+        if self.running():
+            keys = list()
+            aggregates = list()
+            for key, aggregate in self.running_stats.groups.items():
+                sig_num, svid = key >> 8, key & 0xff
+                band = str(self.sig_num_ref[sig_num]['band'])
+                if band in BAND_THRESHOLDS and sig_num in self.band_sig_nums(band):
+                    keys.append((band, self.get_svid(svid), sig_num, svid))
+                    aggregates.append(aggregate)
+            self.sat_stats = band_statistics.running_table(keys, aggregates, len(self.events) > 0)
+            self.gain_stats = pd.DataFrame(
+                [(sig_num, count, total / count) for sig_num, (count, total, _, _) in self.running_stats.gains.items()],
+                columns=band_statistics.GAIN_STAT_COLUMNS)
+        else:
+            keys, series = self.stats_series()
+            self.sat_stats = band_statistics.satellite_table(keys, series, BAND_THRESHOLDS, self.events['tow'],
+                                                             self.event_sampling, self.event_tolerance)
+            self.gain_stats = band_statistics.gain_table(
+                {sig_num: gain['gain'] for sig_num, gain in self.gain_signals.items()})
+        self.summaries = {band: band_statistics.band_summary(self.sat_stats, band, MIN_LENGTH, BAND_THRESHOLDS[band])
+                          for band in BAND_THRESHOLDS}
+
+    def stats_series(self):
+        '''(band, sat, sig_num, svid) keys and (tow, cn0) of all stored series of the bands with thresholds'''
+        keys, series = list(), list()
+        for band, sig_num, svid, columns in self.stats_signals():
+            keys.append((band, self.get_svid(svid), sig_num, svid))
+            series.append((columns['tow'], columns['cn0']))
+        return keys, series
+
+    def stats_signals(self):
+        '''band, sig_num, svid and columns of all stored series of the bands with thresholds'''
+        for band in BAND_THRESHOLDS:
+            sig_nums = self.band_sig_nums(band)
+            for (sig_num, svid), columns in self.signals.items():
+                if sig_num in sig_nums:
+                    yield band, sig_num, svid, columns
+
+    def get_window_index(self):
+        '''Built on the first window query after a load or update, so loads without one do not pay for it'''
+        if self.streaming:
+            raise ValueError('Window statistics need the stored series, they are not kept in streaming mode')
+        if self.window_index is None:
+            keys, series = self.stats_series()
+            self.window_index = WindowIndex(keys, series, BAND_THRESHOLDS, self.events['tow'],
+                                            self.event_sampling, self.event_tolerance)
+        return self.window_index
+
+    def window_stats(self, tow_first, tow_last):
+        '''Per-satellite count, mean, max and samples over the thresholds of the epochs with
+        tow_first <= tow <= tow_last [ms], in O(log n), see window_stats.WindowIndex.query'''
+        return self.get_window_index().query(tow_first, tow_last)
+
+    def window_summary(self, band, tow_first, tow_last):
+        '''Like summaries[band], for the satellites and events between tow_first and tow_last [ms]'''
+        return band_statistics.band_summary(self.window_stats(tow_first, tow_last), band, MIN_LENGTH,
+                                            BAND_THRESHOLDS[band])
+
+    def windows(self, spec):
+        '''WNc and first and last TOW [ms] of consecutive windows over the stored epochs
+
+        spec is a window length [s], or WINDOW_EVENTS for the windows from
+        every ExtEvent up to the next one. Windows are laid out in GPS time,
+        WNc and TOW combined, and split where a week rolls over, so each of
+        them can be looked up by TOW in the window index.'''
+        if not self.get_window_index().key.size:
+            return list()
+        if spec == WINDOW_EVENTS:
+            events = np.unique(gps_ms(self.events['wnc'], self.events['tow']))
+            return list(zip(*(part.tolist() for part in split_weeks(events[:-1], events[1:] - 1))))
+        width = int(round(float(spec) * 1000))
+        if width <= 0:
+            raise ValueError('Window length must be positive')
+        time = np.concatenate([gps_ms(columns['wnc'], columns['tow']) for _, _, _, columns in self.stats_signals()])
+        first = np.arange(int(time.min()), int(time.max()) + 1, width)
+        return list(zip(*(part.tolist() for part in split_weeks(first, first + width - 1))))
+
+    def window_rows(self, spec):
+        '''One row of WINDOW_COLUMNS per window of spec and band, for batch processing
+
+        Windows are summarized WINDOW_CHUNK at a time.'''
+        windows = np.array(self.windows(spec), dtype=np.int64).reshape(-1, 3)
+        rows = list()
+        for start in range(0, len(windows), WINDOW_CHUNK):
+            wnc, first, last = windows[start:start + WINDOW_CHUNK].T
+            for band, (best, good) in BAND_THRESHOLDS.items():
+                summary = self.get_window_index().summaries(first, last, band, MIN_LENGTH, (best, good))
+                for i in range(len(first)):
+                    rows.append({
+                        'Window': start + i,
+                        'WNc [weeks]': int(wnc[i]),
+                        'First TOW [ms]': int(first[i]),
+                        'Last TOW [ms]': int(last[i]),
+                        'Band': band,
+                        'Num. of sat. [ ]': int(summary['n_sats'][i]),
+                        'Best sat. [dB-Hz]': summary['max'][i],
+                        'Avg. of top sat. [dB-Hz]': summary['top_mean'][i],
+                        'Len. of top sat. [ ]': int(summary['top_length'][i]),
+                        'Best threshold [dB-Hz]': best,
+                        'n sat. over best threshold [ ]': int(summary['n_over'][best][i]),
+                        'Good threshold [dB-Hz]': good,
+                        'n sat. over good threshold [ ]': int(summary['n_over'][good][i]),
+                        'Num. of ExtEvent': int(summary['n_events'][i])
+                    })
+        rows.sort(key=lambda row: row['Window'])
+        return rows
+
     def update_signals(self, tow, wnc, svid, sig_type, cn0, locktime):
+        if not len(tow):
+            return
         sig_num = self.get_band(sig_type)
-        svid_offset = self.get_svid(svid)
         snr = self.get_snr(cn0, sig_num)
-        if not sig_num in self.signals.keys():
-            self.signals[sig_num] = dict()
-
-        if not svid_offset in self.signals[sig_num].keys():
-            self.signals[sig_num][svid_offset] = {
-                'snr': list(),
-                'tow': list()
-            }
-        self.signals[sig_num][svid_offset]['snr'].append(snr)
-        self.signals[sig_num][svid_offset]['tow'].append(tow)
-        if tow < self.mission_min_tow:
-            self.mission_min_tow = tow
-        if tow > self.mission_max_tow:
-            self.mission_max_tow = tow
+        if self.running():
+            self.running_stats.update_signals(tow, sig_num, svid, snr)
+        if not self.streaming:
+            self.signals.extend(tow, wnc, sig_num, svid, snr, locktime)
 
-    def update_gain(self, tow, wnc, frontend_id, gain):
-        sig_num = self.get_band(frontend_id)
-        if not self.gain_num_ref[sig_num]['en']:
+    def update_mission(self, tow):
+        '''tow of all measurement epochs, including those without enabled signals'''
+        if not len(tow):
             return
-        if not sig_num in self.gain_signals.keys():
-            self.gain_signals[sig_num] = {'tow': list(), 'gain': list()}
-        self.gain_signals[sig_num]['tow'].append(tow)
-        self.gain_signals[sig_num]['gain'].append(gain)
+        self.mission_min_tow = min(self.mission_min_tow, tow.min())
+        self.mission_max_tow = max(self.mission_max_tow, tow.max())
+
+    def update_gain(self, tow, wnc, frontend_id, gain):
+        sig_nums = self.get_band(frontend_id)
+        for sig_num in np.unique(sig_nums).tolist():
+            if sig_num not in self.gain_num_ref or not self.gain_num_ref[sig_num]['en']:
+                continue
+            mask = sig_nums == sig_num
+            if self.running():
+                self.running_stats.update_gain(sig_nums[mask], gain[mask])
+            if self.streaming:
+                continue
+            if not sig_num in self.gain_signals.keys():
+                self.gain_signals[sig_num] = ColumnBuffer(GAIN_COLUMNS)
+            self.gain_signals[sig_num].extend(tow=tow[mask], wnc=wnc[mask], gain=gain[mask])
+
+    def enabled_sig_nums(self):
+        return {num for num, ref in self.sig_num_ref.items() if ref['en']}
+
+    def band_sig_nums(self, band):
+        return {num for num, ref in self.sig_num_ref.items() if str(ref['band']) == band and ref['en']}
+
+    def band_series(self, band):
+        sig_nums = self.band_sig_nums(band)
+        for (sig_num, svid), columns in self.signals.items():
+            if sig_num in sig_nums:
+                yield self.get_svid(svid), columns
 
     def to_dict_df(self):
-        for num in self.signals:
-            if self.sig_num_ref[num]['band'] == 1 and self.sig_num_ref[num]['en'] == True:
-                for sat in self.signals[num]:
-                    self.dict_df['1'][sat] = pd.DataFrame(data=self.signals[num][sat]['snr'],
-                                                          index=self.signals[num][sat]['tow'])
-            elif self.sig_num_ref[num]['band'] == 2 and self.sig_num_ref[num]['en'] == True:
-                for sat in self.signals[num]:
-                    self.dict_df['2'][sat] = pd.DataFrame(data=self.signals[num][sat]['snr'],
-                                                          index=self.signals[num][sat]['tow'])
-
-    def update_sorted_mean_list(self, band):
-        if self.events['tow'] == list():
-            for sat in self.dict_df[band]:
-                values = self.dict_df[band].get(sat, pd.Series())
-                if values.empty:
-                    self.means[band].append(0.0)
-                else:
-                    value = values.mean()
-                    self.means[band].append(value[0])
-        else:
-            for sat in self.dict_df[band]:
-                self.means[band].append(self.get_event_mean(self.dict_df[band][sat], self.events))
-        self.means[band].sort(reverse=True)
-
-    def get_event_mean(self, sat, events):
-        mean_list = list()
-        for trig in events['tow']:
-            trig_alt = int(trig/100)*100
-            value_event = sat.loc[sat.index == trig_alt]
-            if not value_event.empty:
-                val_list = value_event[0].tolist()
-                mean_list.append(val_list[0])
-        if not mean_list == list():
-            return mean(mean_list)
-        else:
-            return 0
+        for band in self.dict_df:
+            for sat, columns in self.band_series(band):
+                self.dict_df[band][sat] = pd.DataFrame(data=columns['cn0'], index=columns['tow'])
 
     def get_max_mean(self, band):
-        if self.means[band] == list():
+        if not self.summaries[band]['n_sats']:
             return DEFAULT_VALUE
-        return self.means[band][0]
+        return self.summaries[band]['max']
 
     def get_top_mean(self, band):
-        length = MIN_LENGTH if len(self.means[band]) > MIN_LENGTH else len(self.means[band])
-        return length, mean(self.means[band][:length])
-
-    def get_n_thresh(self, band, threshold):
-        return sum(i >= threshold for i in self.means[band])
+        return self.summaries[band]['top_length'], self.summaries[band]['top_mean']
 
     def update_events(self, tow, wnc):
-        self.events['tow'].append(tow)
+        self.events.extend(tow=tow, wnc=wnc)
+        if self.running():
+            self.running_stats.update_events(tow)
+        self.n_ext_events = self.n_ext_events + len(tow)
 
     def get_band(self, sig_type):
         return sig_type & 0b00011111
 
     def get_snr(self, cn0, sig_num):
-        if sig_num == 1 or sig_num == 2:
-            return cn0*0.25
-        else:
-            return cn0*0.25+10.0
+        return np.where((sig_num == 1) | (sig_num == 2), cn0*0.25, cn0*0.25+10.0)
 
     def get_mission_duration(self):
         return round((self.mission_max_tow-self.mission_min_tow) / (60. * 1.0e6))
 
     def get_svid(self, svid):
         '''Table 4.1.9'''
-        if svid >= 1 and svid <= 37:
-            return 'G{:02d}'.format(svid)
-        elif svid >= 38 and svid <= 61:
-            return 'R{:02d}'.format(svid-37)
-        elif svid >= 63 and svid <= 68:
-            return 'R{:02d}'.format(svid-38)
-        elif svid >= 71 and svid <= 106:
-            return 'E{:02d}'.format(svid-70)
-        elif svid >= 120 and svid <= 140:
-            return 'S{:02d}'.format(svid-100)
-        elif svid >= 141 and svid <= 177:
-            return 'C{:02d}'.format(svid-40)
-        elif svid >= 181 and svid <= 187:
-            return 'J{:02d}'.format(svid-180)
-        elif svid >= 191 and svid <= 197:
-            return 'I{:02d}'.format(svid-190)
-        elif svid >= 198 and svid <= 215:
-            return 'S{:02d}'.format(svid-157)
-        return svid
+        return svid_ref[svid]
@@ -0,0 +1,257 @@
+'''Vectorized decoding of SBF blocks, see AsteRx-m2 reference guide chapter 4'''
+import binascii
+import struct
+
+import numpy as np
+
+SYNC = b'$@'
+HEADER = struct.Struct('<HHH')
+HEADER_LENGTH = 8
+
+# Block numbers, the revision bits of the block ID are masked out
+MEAS_EPOCH_V2 = 4027
+RECEIVER_STATUS_V2 = 4014
+EXT_EVENT = 5924
+DECODED_BLOCKS = (MEAS_EPOCH_V2, RECEIVER_STATUS_V2, EXT_EVENT)
+
+# Bits 0-4 of a measurement Type field are the signal number, bits 5-7 the antenna
+SIG_NUM_MASK = 0x1f
+N_SIG_NUMS = 32
+
+BLOCK_DTYPE = np.dtype([('offset', '<i8'), ('id', '<u2'), ('length', '<u2')])
+CHUNK_BYTES = 1 << 24
+
+
+def scan_blocks(buf, start=0, end=None, progress=None, final=False):
+    '''Finds all blocks with a valid CRC in buf[start:end]
+
+    Sync candidates are found by a vectorized search, CHUNK_BYTES at a time.
+    Assuming all of them are valid, the chain of candidates a scan from the
+    first one would visit is followed with pointer doubling, and CRCs are only
+    checked along it. Candidates failing the check are stepped over and the
+    chain is followed again, until all CRCs on it are valid.
+
+    progress(pos) is called with the offset reached after every window, it may
+    raise to abort the scan.
+
+    Returns the block index and the offset from where to continue scanning,
+    which is the start of an incomplete block at the end of the buffer. With
+    final, no more bytes follow buf[:end], so a header running past end is
+    stepped over like a CRC failure and the scan always continues from end.'''
+    data = np.frombuffer(buf, dtype=np.uint8)
+    end = len(data) if end is None else end
+    view = memoryview(buf)
+    found = list()
+    pos = tail = start
+    while pos < end:
+        window_end = min(pos + CHUNK_BYTES, end)
+        sync = sync_positions(data, pos, window_end, end)
+        complete = sync + HEADER_LENGTH <= end
+        header = np.zeros((3, sync.size), dtype=np.int64)
+        header[:, complete] = [read(data, sync[complete] + i, '<u2') for i in (2, 4, 6)]
+        length = header[2]
+        plausible = complete & (length >= HEADER_LENGTH) & (length % 4 == 0)
+        # A scan ends at an incomplete block, unless no more bytes follow
+        incomplete = ~complete | (plausible & (sync + length > end))
+        stop = np.zeros(sync.size, dtype=bool) if final else incomplete
+        valid = plausible & ~incomplete
+        checked = np.zeros(sync.size, dtype=bool)
+        after = np.searchsorted(sync, sync + length)
+        while True:
+            chain = follow(np.where(stop, sync.size, np.where(valid, after, np.arange(1, sync.size + 1))))
+            unchecked = chain[valid[chain] & ~checked[chain]]
+            if not unchecked.size:
+                break
+            offsets, lengths = sync[unchecked].tolist(), length[unchecked].tolist()
+            crc = [binascii.crc_hqx(view[offset + 4:offset + length], 0)
+                   for offset, length in zip(offsets, lengths)]
+            checked[unchecked] = True
+            valid[unchecked] = np.array(crc) == header[0, unchecked]
+        blocks = chain[valid[chain]]
+        found.append(np.stack((sync[blocks], header[1, blocks], length[blocks])))
+        if blocks.size:
+            tail = int(sync[blocks[-1]] + length[blocks[-1]])
+        if chain.size and stop[chain[-1]]:
+            return to_index(found), int(sync[chain[-1]])
+        pos = max(window_end, tail)
+        if progress is not None:
+            progress(pos)
+    if not final and end > max(start, tail) and data[end - 1] == SYNC[0]:
+        return to_index(found), end - 1
+    return to_index(found), end
+
+
+def sync_positions(data, first, last, end):
+    '''Positions first <= pos < last of SYNC in data[:end]'''
+    last = min(last, end - 1)
+    if last <= first:
+        return np.empty(0, dtype=np.int64)
+    pos = first + np.flatnonzero(data[first:last] == SYNC[0])
+    return pos[data[pos + 1] == SYNC[1]]
+
+
+def follow(successor):
+    '''Indexes visited from index 0 by i = successor[i] until len(successor), in
+    O(n log n) by pointer doubling: after k steps all indexes less than 2**k hops away are known'''
+    n = len(successor)
+    if not n:
+        return np.empty(0, dtype=np.int64)
+    jump = np.append(successor, n)
+    visited = np.zeros(1, dtype=np.int64)
+    while True:
+        reached = jump[visited]
+        reached = reached[reached < n]
+        if not reached.size:
+            return visited
+        visited = np.union1d(visited, reached)
+        jump = jump[jump]
+
+
+def to_index(found):
+    blocks = np.concatenate([np.empty((3, 0), dtype=np.int64)] + found, axis=1)
+    index = np.empty(blocks.shape[1], dtype=BLOCK_DTYPE)
+    index['offset'] = blocks[0]
+    index['id'] = blocks[1] & 0x1fff
+    index['length'] = blocks[2]
+    return index
+
+
+class BlockStream:
+    '''Splits bytes arriving in pieces of any size, e.g. from a socket, into blocks
+
+    Blocks cut at the end of a piece are kept until the rest arrives.'''
+
+    def __init__(self):
+        self.buf = b''
+
+    def feed(self, new, final=False):
+        '''Returns the data and block index of all blocks completed by new
+
+        final tells that new is the last piece, see scan_blocks.'''
+        buf = self.buf + new
+        index, end = scan_blocks(buf, final=final)
+        self.buf = buf[end:]
+        return np.frombuffer(buf, dtype=np.uint8), index
+
+
+def read_chunks(fobj, chunk_bytes=CHUNK_BYTES):
+    '''Yields the data and block index of consecutive chunks of a binary file
+
+    Blocks cut at the end of a chunk are carried over to the next one. The
+    last, short chunk is scanned as final, so a corrupt header near the end
+    of the file does not hide the blocks after it.'''
+    stream = BlockStream()
+    while True:
+        new = fobj.read(chunk_bytes)
+        final = len(new) < chunk_bytes
+        yield stream.feed(new, final)
+        if final:
+            return
+
+
+def read(data, pos, dtype):
+    '''Gathers one little endian value of dtype at every position of pos'''
+    dtype = np.dtype(dtype)
+    raw = data[np.asarray(pos, dtype=np.int64)[:, None] + np.arange(dtype.itemsize)]
+    return raw.view(dtype).ravel()
+
+
+def decode_time(data, offsets):
+    return read(data, offsets + 8, '<u4'), read(data, offsets + 12, '<u2')
+
+
+def decode_ext_event(data, offsets):
+    tow, wnc = decode_time(data, offsets)
+    return {'tow': tow, 'wnc': wnc}
+
+
+def decode_receiver_status(data, offsets):
+    '''Flattens the AGCState sub-blocks of ReceiverStatus_v2 blocks'''
+    tow, wnc = decode_time(data, offsets)
+    n = data[offsets + 28].astype(np.int64)
+    sb_length = data[offsets + 29].astype(np.int64)
+    first = np.cumsum(n) - n
+    entry = np.arange(n.sum()) - np.repeat(first, n)
+    pos = np.repeat(offsets + 32, n) + entry * np.repeat(sb_length, n)
+    return {
+        'tow': np.repeat(tow, n),
+        'wnc': np.repeat(wnc, n),
+        'frontend_id': data[pos],
+        'gain': read(data, pos + 1, '<i1')
+    }
+
+
+def meas_epoch_tow(data, offsets):
+    '''TOW of the MeasEpoch_v2 blocks holding at least one measurement'''
+    offsets = np.asarray(offsets, dtype=np.int64)
+    return read(data, offsets[data[offsets + 14] > 0] + 8, '<u4')
+
+
+def decode_meas_epoch(data, offsets, lengths, sig_nums=None):
+    '''Flattens the Type1 and nested Type2 sub-blocks of MeasEpoch_v2 blocks
+
+    All blocks are walked at once, one Type1 sub-block per iteration. If
+    sig_nums is given, sub-blocks of other signal numbers are stepped over
+    after reading their Type byte. Rows are returned in file order.'''
+    keep = np.ones(N_SIG_NUMS, dtype=bool)
+    if sig_nums is not None:
+        keep = np.isin(np.arange(N_SIG_NUMS), list(sig_nums))
+    offsets = np.asarray(offsets, dtype=np.int64)
+    ends = offsets + lengths
+    n1 = data[offsets + 14].astype(np.int64)
+    sb1_length = data[offsets + 15].astype(np.int64)
+    sb2_length = data[offsets + 16].astype(np.int64)
+    pos = offsets + 20
+
+    rows = {'block': list(), 'rank': list(), 'svid': list(), 'type': list(), 'cn0': list(), 'locktime': list()}
+    active = np.arange(offsets.size)
+    rank = 0
+    while active.size:
+        active = active[(n1[active] > rank // 2) & (pos[active] + sb1_length[active] <= ends[active])]
+        if not active.size:
+            break
+        p = pos[active]
+        n2 = data[p + 19].astype(np.int64)
+        next_pos = p + sb1_length[active] + n2 * sb2_length[active]
+        n2[next_pos > ends[active]] = 0
+        pos[active] = next_pos
+
+        sig_type = data[p + 1]
+        found = keep[sig_type & SIG_NUM_MASK]
+        rows['block'].append(active[found])
+        rows['rank'].append(np.full(found.sum(), rank))
+        rows['svid'].append(data[p[found] + 2])
+        rows['type'].append(sig_type[found])
+        rows['cn0'].append(data[p[found] + 15])
+        rows['locktime'].append(read(data, p[found] + 16, '<u2'))
+
+        first = np.cumsum(n2) - n2
+        entry = np.arange(n2.sum()) - np.repeat(first, n2)
+        p2 = np.repeat(p + sb1_length[active], n2) + entry * np.repeat(sb2_length[active], n2)
+        sig_type = data[p2]
+        found = keep[sig_type & SIG_NUM_MASK]
+        p2 = p2[found]
+        rows['block'].append(np.repeat(active, n2)[found])
+        rows['rank'].append(np.full(p2.size, rank + 1))
+        rows['svid'].append(np.repeat(data[p + 2], n2)[found])
+        rows['type'].append(sig_type[found])
+        rows['cn0'].append(data[p2 + 2])
+        rows['locktime'].append(data[p2 + 1].astype(np.uint16))
+        rank += 2
+
+    if not rows['block']:
+        empty = np.empty(0, dtype=np.uint8)
+        return {'tow': np.empty(0, dtype=np.uint32), 'wnc': np.empty(0, dtype=np.uint16), 'svid': empty,
+                'sig_type': empty, 'cn0': empty, 'locktime': np.empty(0, dtype=np.uint16)}
+    rows = {key: np.concatenate(value) for key, value in rows.items()}
+    order = np.lexsort((rows['rank'], rows['block']))
+    block = rows['block'][order]
+    tow, wnc = decode_time(data, offsets)
+    return {
+        'tow': tow[block],
+        'wnc': wnc[block],
+        'svid': rows['svid'][order],
+        'sig_type': rows['type'][order],
+        'cn0': rows['cn0'][order],
+        'locktime': rows['locktime'][order]
+    }
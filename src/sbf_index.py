@@ -0,0 +1,75 @@
+import mmap
+import os
+
+import numpy as np
+
+from pathlib import Path
+from . import sbf_decode
+from .signal_cache import stat_key
+
+INDEX_VERSION = 1
+INDEX_SETTINGS = {'block_index': INDEX_VERSION}
+INDEX_DTYPE = np.dtype([('offset', '<i8'), ('id', '<u2'), ('length', '<u2'), ('tow', '<u4'), ('wnc', '<u2')])
+
+
+class SbfFile:
+    '''Memory-mapped SBF file with an index of all its blocks
+
+    The index (offset, block number, length, TOW, WNc of every block) is built
+    by one sync/CRC scan. With a SignalCache it is kept there, so later opens
+    reuse it as long as the file size and mtime are unchanged, and nothing is
+    written next to the file. progress(bytes_scanned) is passed on to the scan,
+    built tells whether it ran.'''
+
+    def __init__(self, path, cache=None, progress=None):
+        self.path = Path(path)
+        self.fobj = self.path.open('rb')
+        self.stat = stat_key(self.path)
+        size = os.fstat(self.fobj.fileno()).st_size
+        self.mmap = mmap.mmap(self.fobj.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+        self.data = np.frombuffer(self.mmap, dtype=np.uint8) if self.mmap else np.empty(0, dtype=np.uint8)
+        cached = cache.get(self.path, INDEX_SETTINGS) if cache is not None else None
+        self.built = cached is None or 'index' not in cached
+        if not self.built:
+            self.index = cached['index']
+        else:
+            try:
+                self.index = self.build_index(progress)
+            except BaseException:
+                self.close()
+                raise
+            if cache is not None:
+                cache.put(self.path, INDEX_SETTINGS, self.stat, {'index': self.index})
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.data = None
+        if self.mmap is not None:
+            try:
+                self.mmap.close()
+            except BufferError:
+                # Arrays still viewing the map, e.g. in a traceback, it is unmapped once they are gone
+                pass
+        self.fobj.close()
+
+    def select(self, block_ids=None, tow_range=None):
+        '''Returns the index entries of the given block numbers within tow_range = (first, last) [ms]'''
+        mask = np.ones(len(self.index), dtype=bool)
+        if block_ids is not None:
+            mask &= np.isin(self.index['id'], list(block_ids))
+        if tow_range is not None:
+            mask &= (self.index['tow'] >= tow_range[0]) & (self.index['tow'] <= tow_range[1])
+        return self.index[mask]
+
+    def build_index(self, progress=None):
+        blocks, _ = sbf_decode.scan_blocks(self.mmap if self.mmap else b'', progress=progress, final=True)
+        index = np.empty(len(blocks), dtype=INDEX_DTYPE)
+        for name in blocks.dtype.names:
+            index[name] = blocks[name]
+        index['tow'], index['wnc'] = sbf_decode.decode_time(self.data, blocks['offset'])
+        return index
@@ -50,3 +50,19 @@ gain_num_ref = {
     11: {"sig_type": "B1", "en": False},
     12: {"sig_type": "B3", "en": False}
 }
+# From AsteRx-m2 reference guide table 4.1.9: (first SVID, last SVID, prefix, offset to PRN)
+svid_ranges = [
+    (1, 37, "G", 0),
+    (38, 61, "R", 37),
+    (63, 68, "R", 38),
+    (71, 106, "E", 70),
+    (120, 140, "S", 100),
+    (141, 177, "C", 40),
+    (181, 187, "J", 180),
+    (191, 197, "I", 190),
+    (198, 215, "S", 157)
+]
+svid_ref = list(range(256))
+for first, last, prefix, offset in svid_ranges:
+    for svid in range(first, last + 1):
+        svid_ref[svid] = "{}{:02d}".format(prefix, svid - offset)
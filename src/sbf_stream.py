@@ -0,0 +1,100 @@
+'''Byte sources for following a growing SBF file or a receiver stream, and a replay server'''
+import os
+import socket
+import time
+
+from .sbf_index import SbfFile
+
+TCP_PREFIX = 'tcp://'
+CONNECT_TIMEOUT = 5.0
+MS_PER_WEEK = 7 * 24 * 3600 * 1000
+TOW_DO_NOT_USE = 0xffffffff
+
+
+class FileSource:
+    '''Returns whatever was appended to a file since the last read
+
+    Opened non-blocking, so character devices such as a serial port
+    configured beforehand work as well.'''
+
+    def __init__(self, path):
+        self.name = str(path)
+        self.fd = os.open(self.name, os.O_RDONLY | getattr(os, 'O_NONBLOCK', 0))
+
+    def read(self, n):
+        try:
+            return os.read(self.fd, n)
+        except BlockingIOError:
+            return b''
+
+    def close(self):
+        os.close(self.fd)
+
+
+class TcpSource:
+    '''Returns whatever a receiver or replay server sent since the last read'''
+
+    def __init__(self, host, port):
+        self.name = '{}{}:{}'.format(TCP_PREFIX, host, port)
+        self.sock = socket.create_connection((host, port), timeout=CONNECT_TIMEOUT)
+        self.sock.setblocking(False)
+
+    def read(self, n):
+        try:
+            return self.sock.recv(n)
+        except BlockingIOError:
+            return b''
+
+    def close(self):
+        self.sock.close()
+
+
+def open_source(spec):
+    '''tcp://host:port connects to a stream, anything else is a file or device path'''
+    if spec.startswith(TCP_PREFIX):
+        host, port = spec[len(TCP_PREFIX):].rsplit(':', 1)
+        return TcpSource(host, int(port))
+    return FileSource(spec)
+
+
+def replay(sbf_file, port, speed=1.0, host='localhost'):
+    '''Serves a recorded file to one client after the other, blocks are paced by their time stamps'''
+    with SbfFile(sbf_file) as sbf, socket.create_server((host, port)) as server:
+        print('Replaying {} on {}{}:{}'.format(sbf_file, TCP_PREFIX, host, port))
+        try:
+            while True:
+                conn, address = server.accept()
+                with conn:
+                    try:
+                        send_blocks(conn, sbf, speed)
+                    except OSError:
+                        pass
+                print('Replay to {} done'.format(address))
+        except KeyboardInterrupt:
+            pass
+
+
+def send_blocks(conn, sbf, speed):
+    '''Sends all blocks of sbf, every block not before its time relative to the first one
+
+    Blocks due at the same time are sent together.'''
+    if sbf.mmap is None:
+        return
+    start = time.monotonic()
+    first = None
+    pending_start = pending_end = 0
+    for offset, length, tow, wnc in zip(sbf.index['offset'].tolist(), sbf.index['length'].tolist(),
+                                        sbf.index['tow'].tolist(), sbf.index['wnc'].tolist()):
+        if tow != TOW_DO_NOT_USE:
+            t = wnc * MS_PER_WEEK + tow
+            first = t if first is None else first
+            delay = start + (t - first) / 1000. / speed - time.monotonic()
+            if delay > 0:
+                conn.sendall(sbf.mmap[pending_start:pending_end])
+                pending_start = pending_end = offset
+                time.sleep(delay)
+        if offset != pending_end:
+            conn.sendall(sbf.mmap[pending_start:pending_end])
+            pending_start = offset
+        pending_end = offset + length
+    conn.sendall(sbf.mmap[pending_start:pending_end])
@@ -0,0 +1,110 @@
+'''Synthetic SBF logs for benchmarks, block layouts as in the AsteRx-m2 reference guide chapter 4'''
+import binascii
+
+import numpy as np
+
+from .sbf_decode import SYNC, MEAS_EPOCH_V2, RECEIVER_STATUS_V2, EXT_EVENT
+
+RECEIVER_STATUS_REVISION = 1
+TOW_START = 300000000
+WNC = 2100
+# (first SVID, Type1 signal number, Type2 signal number) per constellation: GPS L1CA/L2C, GLONASS L1CA/L2CA
+CONSTELLATIONS = ((1, 0, 3), (38, 8, 11))
+FRONTENDS = (0, 1, 3, 4)
+
+HEADER = [('sync', 'S2'), ('crc', '<u2'), ('id', '<u2'), ('length', '<u2')]
+TIME = [('tow', '<u4'), ('wnc', '<u2')]
+TYPE1 = np.dtype([('rx_channel', 'u1'), ('type', 'u1'), ('svid', 'u1'), ('misc', 'u1'), ('code_lsb', '<u4'),
+                  ('doppler', '<i4'), ('carrier_lsb', '<u2'), ('carrier_msb', 'i1'), ('cn0', 'u1'),
+                  ('locktime', '<u2'), ('obs_info', 'u1'), ('n2', 'u1')])
+TYPE2 = np.dtype([('type', 'u1'), ('locktime', 'u1'), ('cn0', 'u1'), ('offsets_msb', 'u1'), ('carrier_msb', 'i1'),
+                  ('obs_info', 'u1'), ('code_offset_lsb', '<u2'), ('carrier_lsb', '<u2'),
+                  ('doppler_offset_lsb', '<u2')])
+EXT_EVENT_DTYPE = np.dtype(HEADER + TIME + [('source', 'u1'), ('polarity', 'u1'), ('offset', '<f4'),
+                                            ('rx_clk_bias', '<f8'), ('pvt_age', '<u2'), ('padding', 'V2')])
+AGC_STATE = np.dtype([('frontend_id', 'u1'), ('gain', 'i1'), ('sample_var', 'u1'), ('blanking_stat', 'u1')])
+RECEIVER_STATUS_DTYPE = np.dtype(HEADER + TIME + [('cpu_load', 'u1'), ('ext_error', 'u1'), ('up_time', '<u4'),
+                                                  ('rx_state', '<u4'), ('rx_error', '<u4'), ('n', 'u1'),
+                                                  ('sb_length', 'u1'), ('cmd_count', 'u1'), ('temperature', 'u1'),
+                                                  ('agc', AGC_STATE, (len(FRONTENDS),))])
+
+
+def meas_epoch_dtype(n_sats):
+    '''MeasEpoch_v2 with n_sats Type1 sub-blocks, each with one nested Type2 sub-block'''
+    return np.dtype(HEADER + TIME + [('n1', 'u1'), ('sb1_length', 'u1'), ('sb2_length', 'u1'),
+                                     ('common_flags', 'u1'), ('cum_clk_jumps', 'u1'), ('reserved', 'u1'),
+                                     ('sats', [('type1', TYPE1), ('type2', TYPE2)], (n_sats,))])
+
+
+def write_sbf(path, duration=600, rate=10, n_sats=16, event_rate=1.0, seed=0):
+    '''Writes duration [s] of MeasEpoch_v2 at rate [Hz] for n_sats satellites, ExtEvents at
+    event_rate [1/s] on average and a ReceiverStatus_v2 every second
+
+    CN0 follows a random walk with occasional dips. Returns the number of blocks written.'''
+    rng = np.random.default_rng(seed)
+    n_epochs = int(duration * rate)
+    period = 1000 // rate
+    tow = TOW_START + period * np.arange(n_epochs, dtype=np.int64)
+
+    meas = np.zeros(n_epochs, dtype=meas_epoch_dtype(n_sats))
+    set_header(meas, MEAS_EPOCH_V2, tow)
+    meas['n1'] = n_sats
+    meas['sb1_length'] = TYPE1.itemsize
+    meas['sb2_length'] = TYPE2.itemsize
+    sats = meas['sats']
+    first_svid, type1, type2 = np.array([CONSTELLATIONS[i % len(CONSTELLATIONS)] for i in range(n_sats)]).T
+    sats['type1']['rx_channel'] = np.arange(n_sats)
+    sats['type1']['type'] = type1
+    sats['type1']['svid'] = first_svid + np.arange(n_sats) // len(CONSTELLATIONS)
+    sats['type1']['n2'] = 1
+    sats['type2']['type'] = type2
+    cn0 = 42.0 + 6.0 * rng.random(n_sats) + np.cumsum(rng.normal(0.0, 0.05, (n_epochs, n_sats)), axis=0)
+    cn0[rng.random((n_epochs, n_sats)) < 0.001] -= 15.0
+    # Signal numbers other than 1 and 2 are stored as (CN0 - 10 dB-Hz) * 4, L2 is 6 dB below L1
+    sats['type1']['cn0'] = np.clip(np.round((cn0 - 10.0) * 4), 0, 255)
+    sats['type2']['cn0'] = np.clip(np.round((cn0 - 16.0) * 4), 0, 255)
+    sats['type1']['locktime'] = np.minimum(np.arange(n_epochs) // rate, 65534)[:, None]
+    sats['type2']['locktime'] = np.minimum(np.arange(n_epochs) // rate, 254)[:, None]
+    set_crc(meas)
+
+    event_tow = np.sort(TOW_START + rng.integers(0, n_epochs * period, rng.poisson(event_rate * duration)))
+    events = np.zeros(event_tow.size, dtype=EXT_EVENT_DTYPE)
+    set_header(events, EXT_EVENT, event_tow)
+    set_crc(events)
+
+    status = np.zeros(-(-n_epochs // rate), dtype=RECEIVER_STATUS_DTYPE)
+    set_header(status, RECEIVER_STATUS_V2 | RECEIVER_STATUS_REVISION << 13, tow[::rate])
+    status['n'] = len(FRONTENDS)
+    status['sb_length'] = AGC_STATE.itemsize
+    status['agc']['frontend_id'] = FRONTENDS
+    status['agc']['gain'] = 30 + rng.integers(0, 4, (len(status), len(FRONTENDS)))
+    set_crc(status)
+
+    # An event is logged after the epoch it falls into, a status block before its epoch
+    epoch_of_event = (event_tow - TOW_START) // period
+    n_events = np.bincount(epoch_of_event, minlength=n_epochs)
+    next_event = 0
+    with open(str(path), 'wb') as sbf_fobj:
+        for epoch in range(n_epochs):
+            if epoch % rate == 0:
+                sbf_fobj.write(status[epoch // rate].tobytes())
+            sbf_fobj.write(meas[epoch].tobytes())
+            if n_events[epoch]:
+                sbf_fobj.write(events[next_event:next_event + n_events[epoch]].tobytes())
+                next_event += n_events[epoch]
+    return len(meas) + len(events) + len(status)
+
+
+def set_header(blocks, block_id, tow):
+    blocks['sync'] = SYNC
+    blocks['id'] = block_id
+    blocks['length'] = blocks.dtype.itemsize
+    blocks['tow'] = tow
+    blocks['wnc'] = WNC
+
+
+def set_crc(blocks):
+    if not len(blocks):
+        return
+    raw = blocks.view(np.uint8).reshape(len(blocks), -1)
+    blocks['crc'] = [binascii.crc_hqx(row[4:], 0) for row in raw]
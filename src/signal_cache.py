@@ -0,0 +1,111 @@
+import hashlib
+import json
+import os
+import shutil
+
+import numpy as np
+
+from pathlib import Path
+from .signal_store import wrap_columns
+
+CACHE_VERSION = 1
+CACHE_DIR = Path.home() / '.cache' / 'sbf_viewer'
+MAX_CACHE_BYTES = 2 << 30
+STAT_FILE = 'stat.npy'
+TMP_SUFFIX = '.tmp'
+
+
+class SignalCache:
+    '''Decoded signals of recently opened files, so opening a file again maps arrays instead of parsing
+
+    Every entry is a directory of .npy files, valid as long as size and
+    mtime of its SBF file are unchanged. Entries are memory-mapped on load.
+    Once the cache exceeds max_bytes the least recently used entries are
+    removed.'''
+
+    def __init__(self, directory=CACHE_DIR, max_bytes=MAX_CACHE_BYTES):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+
+    def entry(self, sbf_file, settings):
+        key = json.dumps([CACHE_VERSION, str(Path(sbf_file).resolve()), settings], sort_keys=True)
+        return self.directory / hashlib.sha1(key.encode()).hexdigest()
+
+    def get(self, sbf_file, settings):
+        '''Returns the memory-mapped arrays stored for sbf_file, or None'''
+        entry = self.entry(sbf_file, settings)
+        try:
+            if not np.array_equal(np.load(str(entry / STAT_FILE)), stat_key(sbf_file)):
+                return None
+            arrays = {path.stem: np.load(str(path), mmap_mode='r')
+                      for path in entry.glob('*.npy') if path.name != STAT_FILE}
+            os.utime(str(entry))
+        except (OSError, ValueError):
+            return None
+        return arrays
+
+    def put(self, sbf_file, settings, stat, arrays):
+        '''stat is the stat_key of sbf_file taken before it was decoded'''
+        if sum(values.nbytes for values in arrays.values()) > self.max_bytes:
+            return
+        entry = self.entry(sbf_file, settings)
+        tmp = entry.with_name(entry.name + TMP_SUFFIX)
+        try:
+            shutil.rmtree(str(tmp), ignore_errors=True)
+            tmp.mkdir(parents=True)
+            for name, values in arrays.items():
+                np.save(str(tmp / (name + '.npy')), values)
+            np.save(str(tmp / STAT_FILE), stat)
+            shutil.rmtree(str(entry), ignore_errors=True)
+            os.replace(str(tmp), str(entry))
+        except OSError:
+            shutil.rmtree(str(tmp), ignore_errors=True)
+            return
+        self.evict()
+
+    def evict(self):
+        entries = list()
+        for entry in self.directory.iterdir():
+            if not entry.is_dir() or entry.name.endswith(TMP_SUFFIX):
+                continue
+            try:
+                size = sum(path.stat().st_size for path in entry.iterdir())
+                entries.append((entry.stat().st_mtime, size, entry))
+            except OSError:
+                pass
+        total = sum(size for mtime, size, entry in entries)
+        for mtime, size, entry in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(str(entry), ignore_errors=True)
+            total -= size
+
+
+def stat_key(sbf_file):
+    stat = os.stat(str(sbf_file))
+    return np.array([CACHE_VERSION, stat.st_size, stat.st_mtime_ns], dtype=np.int64)
+
+
+def pack(prefix, groups, columns):
+    '''Concatenates a dict of ColumnBuffers into flat arrays, keys and starts locate every group'''
+    keys = list(groups)
+    lengths = [len(groups[key]) for key in keys]
+    arrays = {
+        prefix + '_keys': np.array([np.atleast_1d(key) for key in keys], dtype=np.int64) if keys
+        else np.empty((0, 1), dtype=np.int64),
+        prefix + '_starts': np.cumsum([0] + lengths, dtype=np.int64)
+    }
+    for name, dtype in columns:
+        arrays[prefix + '_' + name] = np.concatenate([np.empty(0, dtype=dtype)] + [groups[key][name] for key in keys])
+    return arrays
+
+
+def unpack(arrays, prefix, columns):
+    '''Inverse of pack, the ColumnBuffers are views of the given arrays'''
+    starts = arrays[prefix + '_starts'].tolist()
+    groups = dict()
+    for i, key in enumerate(arrays[prefix + '_keys'].tolist()):
+        key = tuple(key) if len(key) > 1 else key[0]
+        groups[key] = wrap_columns(**{name: arrays[prefix + '_' + name][starts[i]:starts[i + 1]]
+                                      for name, dtype in columns})
+    return groups
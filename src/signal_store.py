@@ -0,0 +1,124 @@
+import numpy as np
+
+from .gps_time import gps_days
+
+INITIAL_CAPACITY = 256
+
+# Columns kept per (sig_num, svid) group, sig_num and svid are implied by the group key
+SERIES_COLUMNS = (
+    ('tow', np.uint32),
+    ('wnc', np.uint16),
+    ('cn0', np.float32),
+    ('locktime', np.uint16)
+)
+EVENT_COLUMNS = (
+    ('tow', np.uint32),
+    ('wnc', np.uint16)
+)
+GAIN_COLUMNS = (
+    ('tow', np.uint32),
+    ('wnc', np.uint16),
+    ('gain', np.int8)
+)
+
+
+class ColumnBuffer:
+    '''Typed columns of equal length which grow by doubling their capacity'''
+
+    def __init__(self, columns=SERIES_COLUMNS, capacity=INITIAL_CAPACITY):
+        self.size = 0
+        self.data = {name: np.empty(capacity, dtype=dtype) for name, dtype in columns}
+        self.dates = None
+        self.dates_epoch = None
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, name):
+        return self.data[name][:self.size]
+
+    def capacity(self):
+        return len(next(iter(self.data.values())))
+
+    def reserve(self, n):
+        capacity = self.capacity()
+        if self.size + n <= capacity:
+            return
+        self.resize(max(2*capacity, self.size + n))
+
+    def resize(self, capacity):
+        for name, column in self.data.items():
+            grown = np.empty(capacity, dtype=column.dtype)
+            grown[:self.size] = column[:self.size]
+            self.data[name] = grown
+
+    def extend(self, **columns):
+        n = len(next(iter(columns.values())))
+        self.reserve(n)
+        for name, values in columns.items():
+            self.data[name][self.size:self.size + n] = values
+        self.size += n
+
+    def datenum(self, epoch=0.0):
+        '''Time of all rows as days since the GPS epoch plus epoch, needs tow and wnc columns
+
+        Computed once, rows added later only extend it.'''
+        if self.dates is None or self.dates_epoch != epoch:
+            self.dates = ColumnBuffer((('datenum', np.float64),), capacity=0)
+            self.dates_epoch = epoch
+        done = len(self.dates)
+        if done < self.size:
+            self.dates.extend(datenum=epoch + gps_days(self['wnc'][done:], self['tow'][done:]))
+        return self.dates['datenum']
+
+    def shrink_to_fit(self):
+        if self.capacity() > self.size:
+            self.resize(self.size)
+
+
+def wrap_columns(**columns):
+    '''ColumnBuffer using the given equally long arrays as its columns, without copying them'''
+    buffer = ColumnBuffer(tuple((name, values.dtype) for name, values in columns.items()), capacity=0)
+    buffer.data = dict(columns)
+    buffer.size = len(next(iter(columns.values())))
+    return buffer
+
+
+class SignalStore:
+    '''Columnar store of CN0 samples, grouped by (sig_num, svid)
+
+    Samples are written in bulk, every group keeps its own typed columns so
+    per-satellite series are zero-copy slices.'''
+
+    def __init__(self):
+        self.groups = dict()
+
+    def __len__(self):
+        return sum(len(columns) for columns in self.groups.values())
+
+    def __getitem__(self, key):
+        return self.groups[key]
+
+    def items(self):
+        return self.groups.items()
+
+    def extend(self, tow, wnc, sig_num, svid, cn0, locktime):
+        key = np.asarray(sig_num, dtype=np.uint16) << 8 | np.asarray(svid, dtype=np.uint16)
+        if key.size == 0:
+            return
+        order = np.argsort(key, kind='stable')
+        key = key[order]
+        starts = np.concatenate(([0], np.flatnonzero(np.diff(key)) + 1))
+        stops = np.append(starts[1:], key.size)
+        tow, wnc = np.asarray(tow), np.asarray(wnc)
+        cn0, locktime = np.asarray(cn0), np.asarray(locktime)
+        for start, stop in zip(starts, stops):
+            group = (int(key[start] >> 8), int(key[start] & 0xff))
+            if group not in self.groups:
+                self.groups[group] = ColumnBuffer()
+            idx = order[start:stop]
+            self.groups[group].extend(tow=tow[idx], wnc=wnc[idx], cn0=cn0[idx], locktime=locktime[idx])
+
+    def finalize(self):
+        for columns in self.groups.values():
+            columns.shrink_to_fit()
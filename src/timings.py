@@ -0,0 +1,86 @@
+import sys
+import time
+
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+STAGES = (
+    'index',
+    'read',
+    'decode MeasEpoch_v2',
+    'decode ExtEvent',
+    'decode ReceiverStatus_v2',
+    'signals',
+    'events',
+    'gain',
+    'running stats',
+    'cache',
+    'dataframes',
+    'statistics',
+    'csv write'
+)
+TOTAL_COLUMN = 'Total [s]'
+RSS_COLUMN = 'Process peak RSS [MB]'
+
+
+class Timings:
+    '''Wall time per processing stage of one file, plus its size and block count
+
+    The peak RSS in a row is that of the whole process up to the end of the
+    file, so it includes the files the same process handled before.
+
+    When disabled, a stage costs one attribute check.'''
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.seconds = dict.fromkeys(STAGES, 0.0)
+        self.bytes = 0
+        self.blocks = 0
+
+    @contextmanager
+    def stage(self, name):
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.seconds[name] += time.perf_counter() - start
+
+    def to_dict(self):
+        '''One row of the timing table, see timing_columns'''
+        row = {'Bytes': self.bytes, 'Blocks': self.blocks, RSS_COLUMN: peak_rss_mb()}
+        row.update({stage_column(name): seconds for name, seconds in self.seconds.items()})
+        row[TOTAL_COLUMN] = sum(self.seconds.values())
+        return row
+
+
+def stage_column(name):
+    return '{} [s]'.format(name)
+
+
+def timing_columns():
+    return ['Bytes', 'Blocks', RSS_COLUMN] + [stage_column(name) for name in STAGES] + [TOTAL_COLUMN]
+
+
+def peak_rss_mb():
+    '''Peak resident memory of this process so far, None where it is unknown'''
+    if resource is None:
+        return None
+    # ru_maxrss is in KiB on Linux and in bytes on macOS
+    scale = 1 if sys.platform == 'darwin' else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / 1e6
+
+
+def format_timings(row):
+    lines = ['{:.1f} MB, {} blocks, process peak RSS {} MB'.format(row['Bytes'] / 1e6, row['Blocks'], row[RSS_COLUMN])]
+    for name in STAGES:
+        if row[stage_column(name)]:
+            lines.append('  {:<26}{:8.3f} s'.format(name, row[stage_column(name)]))
+    lines.append('  {:<26}{:8.3f} s'.format('total', row[TOTAL_COLUMN]))
+    return '\n'.join(lines)
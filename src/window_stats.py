@@ -0,0 +1,144 @@
+'''Per-satellite statistics of any TOW window in O(log n), from indexes built once per data set'''
+import numpy as np
+import pandas as pd
+
+from .band_statistics import KEY_COLUMNS, THRESHOLD_COLUMNS
+from .event_sampling import sample_events, series_key
+
+WINDOW_STAT_COLUMNS = KEY_COLUMNS + ['count', 'mean', 'max'] + THRESHOLD_COLUMNS + \
+    ['event_count', 'event_mean', 'value']
+
+
+class WindowIndex:
+    '''All series in (series, tow) order with prefix sums of CN0 and of the samples
+    at or over the band thresholds, a max tree and prefix sums of the CN0 sampled
+    at every event
+
+    A window then costs two searchsorted over all satellites at once plus one
+    step per tree level, whatever its length.'''
+
+    def __init__(self, keys, series, thresholds, events, mode, tolerance):
+        '''Arguments as for band_statistics.satellite_table'''
+        self.keys = pd.DataFrame(keys, columns=KEY_COLUMNS)
+        self.groups = np.arange(len(series), dtype=np.int64)
+        if series:
+            self.key, cn0 = series_key(series)
+        else:
+            self.key, cn0 = np.empty(0, dtype=np.int64), np.empty(0)
+        group = self.key >> 32
+        self.cn0_sum = prefix_sum(cn0)
+        self.over = list()
+        for i in range(len(THRESHOLD_COLUMNS)):
+            threshold = np.array([thresholds[band][i] for band in self.keys['band']], dtype=np.float64)
+            self.over.append(prefix_sum(cn0 >= threshold[group]))
+        self.tree = max_tree(cn0)
+
+        self.events = np.sort(np.asarray(events, dtype=np.int64))
+        sampled = sample_events(self.key, cn0, len(series), self.events, mode, tolerance)
+        found = ~np.isnan(sampled)
+        self.event_count = prefix_sum(found, axis=1)
+        self.event_sum = prefix_sum(np.where(found, sampled, 0.0), axis=1)
+
+    def stats(self, tow_first, tow_last):
+        '''Arrays of shape (windows, satellites) for windows tow_first[i] <= tow <= tow_last[i] [ms],
+        and the number of events per window
+
+        value is the event mean if events fall into the window, 0 for a
+        satellite without a sample at any of them, else the mean, as in
+        band_statistics.satellite_table. Satellites with neither samples nor
+        event samples in a window are not in it, see present.'''
+        first = np.ceil(np.asarray(tow_first, dtype=np.float64)).astype(np.int64)[:, None]
+        last = np.floor(np.asarray(tow_last, dtype=np.float64)).astype(np.int64)[:, None]
+        lo = np.searchsorted(self.key, self.groups << 32 | first)
+        hi = np.searchsorted(self.key, self.groups << 32 | last, 'right')
+        count = hi - lo
+        stats = {
+            'count': count,
+            'mean': (self.cn0_sum[hi] - self.cn0_sum[lo]) / np.maximum(count, 1),
+            'max': range_max(self.tree, lo, hi)
+        }
+        for name, over in zip(THRESHOLD_COLUMNS, self.over):
+            stats[name] = over[hi] - over[lo]
+
+        event_lo = np.searchsorted(self.events, first[:, 0])
+        event_hi = np.searchsorted(self.events, last[:, 0], 'right')
+        event_count = (self.event_count[:, event_hi] - self.event_count[:, event_lo]).T
+        event_sum = (self.event_sum[:, event_hi] - self.event_sum[:, event_lo]).T
+        stats['n_events'] = event_hi - event_lo
+        stats['event_count'] = event_count
+        stats['event_mean'] = np.where(event_count > 0, event_sum / np.maximum(event_count, 1), np.nan)
+        has_events = (event_hi > event_lo)[:, None]
+        stats['value'] = np.where(has_events, np.where(event_count > 0, stats['event_mean'], 0.0), stats['mean'])
+        return stats
+
+    def query(self, tow_first, tow_last):
+        '''One row per satellite in the window tow_first <= tow <= tow_last [ms], see stats'''
+        stats = self.stats([tow_first], [tow_last])
+        table = self.keys.copy()
+        for name in WINDOW_STAT_COLUMNS[len(KEY_COLUMNS):]:
+            table[name] = stats[name][0]
+        return table[present(stats)[0]].reset_index(drop=True)
+
+    def summaries(self, tow_first, tow_last, band, top_length, thresholds):
+        '''band_statistics.band_summary of many windows at once, as arrays over the windows'''
+        stats = self.stats(tow_first, tow_last)
+        in_band = (self.keys['band'] == band).to_numpy()
+        valid = present(stats)[:, in_band]
+        values = np.where(valid, stats['value'][:, in_band], -np.inf)
+        ranked = -np.sort(-values, axis=1)
+        n_sats = valid.sum(axis=1)
+        length = np.minimum(top_length, n_sats)
+        top = ranked[:, :top_length]
+        top_sum = np.where(np.arange(top.shape[1]) < length[:, None], top, 0.0).sum(axis=1)
+        return {
+            'n_sats': n_sats,
+            'max': np.where(n_sats > 0, ranked[:, 0] if ranked.shape[1] else np.nan, np.nan),
+            'top_length': length,
+            'top_mean': np.where(length > 0, top_sum / np.maximum(length, 1), np.nan),
+            'n_over': {threshold: (values >= threshold).sum(axis=1) for threshold in thresholds},
+            'n_events': stats['n_events']
+        }
+
+
+def present(stats):
+    '''Whether a satellite has samples in a window, or samples at its events, which snap may take from before it'''
+    return (stats['count'] > 0) | (stats['event_count'] > 0)
+
+
+def prefix_sum(values, axis=0):
+    '''Cumulative sum with a leading 0, so the sum of values[i:j] is result[j] - result[i]'''
+    values = np.asarray(values)
+    values = values.astype(np.int64) if values.dtype == bool else values
+    pad = [(0, 0)] * values.ndim
+    pad[axis] = (1, 0)
+    return np.pad(np.cumsum(values, axis=axis), pad)
+
+
+def max_tree(values):
+    '''Levels of pairwise maxima, level k holds the max of every 2**k values, up to a single root'''
+    levels = [np.asarray(values, dtype=np.float64)]
+    while len(levels[-1]) > 1:
+        level = levels[-1]
+        parent = np.maximum(level[:len(level) // 2 * 2:2], level[1:len(level) // 2 * 2:2])
+        if len(level) % 2:
+            parent = np.append(parent, level[-1])
+        levels.append(parent)
+    return levels
+
+
+def range_max(tree, lo, hi):
+    '''Max of values[lo:hi] for arrays of bounds, NaN for empty ranges
+
+    Walks the tree bottom-up, taking a node whenever a bound is not aligned to its parent.'''
+    result = np.full(np.shape(lo), -np.inf)
+    lo, hi = np.array(lo, dtype=np.int64), np.array(hi, dtype=np.int64)
+    for level in tree:
+        take = (lo & 1).astype(bool) & (lo < hi)
+        result[take] = np.maximum(result[take], level[lo[take]])
+        lo += take
+        take = (hi & 1).astype(bool) & (lo < hi)
+        hi -= take
+        result[take] = np.maximum(result[take], level[hi[take]])
+        lo >>= 1
+        hi >>= 1
+    return np.where(result == -np.inf, np.nan, result)
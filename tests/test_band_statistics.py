@@ -0,0 +1,84 @@
+import numpy as np
+import pytest
+
+from src.band_statistics import (PERCENTILE_COLUMNS, PERCENTILES, SAT_COLUMNS, band_summary, gain_table,
+                                 satellite_table)
+from tests.test_event_sampling import brute_force as sample_brute_force
+
+THRESHOLDS = {'L1': (45.0, 40.0), 'L2': (38.5, 30.0)}
+
+
+def random_series(rng, n_series=8):
+    keys, series = list(), list()
+    for i in range(n_series):
+        band = 'L1' if i % 2 else 'L2'
+        tow = 1000 + 100 * np.sort(rng.choice(80, rng.integers(1, 60), replace=False))
+        # CN0 is decoded in steps of 0.25 dB-Hz
+        cn0 = rng.integers(60, 220, tow.size) * 0.25
+        keys.append((band, 'G{:02d}'.format(i), 1 if band == 'L1' else 3, i))
+        series.append((tow, cn0))
+    return keys, series
+
+
+@pytest.mark.parametrize('mode', ['snap', 'nearest', 'interp'])
+@pytest.mark.parametrize('seed', range(5))
+def test_satellite_table_matches_brute_force(mode, seed):
+    rng = np.random.default_rng(seed)
+    keys, series = random_series(rng)
+    events = np.sort(rng.integers(800, 9000, rng.integers(0, 20)))
+    table = satellite_table(keys, series, THRESHOLDS, events, mode, 150)
+    assert list(table.columns) == SAT_COLUMNS
+    sampled = sample_brute_force(series, events, mode, 150)
+    for i, ((band, sat, sig_num, svid), (tow, cn0)) in enumerate(zip(keys, series)):
+        row = table.iloc[i]
+        assert (row['band'], row['sat'], row['sig_num'], row['svid']) == (band, sat, sig_num, svid)
+        assert row['count'] == cn0.size
+        assert row['mean'] == pytest.approx(cn0.mean())
+        assert row['max'] == cn0.max()
+        for q, name in zip(PERCENTILES, PERCENTILE_COLUMNS):
+            assert row[name] == pytest.approx(np.percentile(cn0, q))
+        assert row['n_over_best'] == np.count_nonzero(cn0 >= THRESHOLDS[band][0])
+        assert row['n_over_good'] == np.count_nonzero(cn0 >= THRESHOLDS[band][1])
+        found = sampled[i][~np.isnan(sampled[i])]
+        assert row['event_count'] == found.size
+        if found.size:
+            assert row['event_mean'] == pytest.approx(found.mean())
+            assert row['value'] == pytest.approx(found.mean())
+        else:
+            assert np.isnan(row['event_mean'])
+            assert row['value'] == (0.0 if events.size else pytest.approx(cn0.mean()))
+
+
+def test_satellite_table_without_series():
+    table = satellite_table([], [], THRESHOLDS, [], 'snap', 100)
+    assert table.empty
+    assert list(table.columns) == SAT_COLUMNS
+
+
+def test_gain_table():
+    gains = {1: np.array([30, 32, 34]), 3: np.array([-5]), 5: np.array([10, 11])}
+    table = gain_table(gains)
+    assert table['sig_num'].tolist() == [1, 3, 5]
+    assert table['count'].tolist() == [3, 1, 2]
+    assert table['mean'].tolist() == [32.0, -5.0, 10.5]
+    assert gain_table({}).empty
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_band_summary_matches_brute_force(seed):
+    rng = np.random.default_rng(seed)
+    keys, series = random_series(rng, n_series=int(rng.integers(1, 12)))
+    table = satellite_table(keys, series, THRESHOLDS, [], 'snap', 100)
+    thresholds = (35.0, 40.0, 45.0)
+    for band in THRESHOLDS:
+        values = sorted(table.loc[table['band'] == band, 'value'], reverse=True)
+        summary = band_summary(table, band, 4, thresholds)
+        assert summary['n_sats'] == len(values)
+        assert summary['max'] == (values[0] if values else None)
+        assert summary['top_length'] == min(4, len(values))
+        if values:
+            assert summary['top_mean'] == pytest.approx(np.mean(values[:4]))
+        else:
+            assert np.isnan(summary['top_mean'])
+        assert summary['n_over'] == {threshold: sum(value >= threshold for value in values)
+                                     for threshold in thresholds}
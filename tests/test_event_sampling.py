@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+
+from src.event_sampling import sample_events, series_key
+
+
+def brute_force(series, events, mode, tolerance):
+    result = np.full((len(series), len(events)), np.nan)
+    for i, (tow, values) in enumerate(series):
+        tow, values = np.asarray(tow, dtype=np.int64), np.asarray(values, dtype=np.float64)
+        for j, event in enumerate(events):
+            if mode == 'snap':
+                hit = np.flatnonzero(tow == event // 100 * 100)
+                if hit.size:
+                    result[i, j] = values[hit[0]]
+                continue
+            before = np.flatnonzero((tow <= event) & (event - tow <= tolerance))
+            after = np.flatnonzero((tow >= event) & (tow - event <= tolerance))
+            if mode == 'nearest':
+                candidates = np.concatenate((before, after))
+                if candidates.size:
+                    distance = np.abs(tow[candidates] - event)
+                    # Ties go to the earlier epoch
+                    best = candidates[np.lexsort((tow[candidates], distance))[0]]
+                    result[i, j] = values[best]
+            elif np.any(tow == event):
+                result[i, j] = values[np.flatnonzero(tow == event)[0]]
+            elif before.size and after.size:
+                l, r = before[-1], after[0]
+                result[i, j] = values[l] + (values[r] - values[l]) * (event - tow[l]) / (tow[r] - tow[l])
+    return result
+
+
+@pytest.mark.parametrize('mode', ['snap', 'nearest', 'interp'])
+@pytest.mark.parametrize('seed', range(5))
+def test_sample_events_matches_brute_force(mode, seed):
+    rng = np.random.default_rng(seed)
+    series = list()
+    for _ in range(6):
+        # 10 Hz epochs with gaps, starting at different times
+        tow = 1000 + 100 * np.sort(rng.choice(60, rng.integers(0, 40), replace=False))
+        series.append((tow, rng.uniform(20, 50, tow.size).round(2)))
+    events = np.sort(rng.integers(800, 7500, 30))
+    key, values = series_key(series)
+    sampled = sample_events(key, values, len(series), events, mode, tolerance=150)
+    expected = brute_force(series, events, mode, 150)
+    np.testing.assert_allclose(sampled, expected, equal_nan=True)
+
+
+def test_snap_takes_the_epoch_before_the_event():
+    key, values = series_key([(np.array([100, 200, 300]), np.array([1.0, 2.0, 3.0]))])
+    assert sample_events(key, values, 1, [199, 200, 250, 399, 450]).tolist()[0][:4] == [1.0, 2.0, 2.0, 3.0]
+    assert np.isnan(sample_events(key, values, 1, [450])[0, 0])
+
+
+def test_nearest_and_interp_respect_the_tolerance():
+    key, values = series_key([(np.array([100, 300]), np.array([10.0, 30.0]))])
+    assert np.isnan(sample_events(key, values, 1, [160], 'nearest', 50)[0, 0])
+    assert sample_events(key, values, 1, [160], 'nearest', 100)[0, 0] == 10.0
+    assert np.isnan(sample_events(key, values, 1, [200], 'interp', 99)[0, 0])
+    assert sample_events(key, values, 1, [200], 'interp', 100)[0, 0] == 20.0
+    assert sample_events(key, values, 1, [300], 'interp', 0)[0, 0] == 30.0
+
+
+def test_series_do_not_mix():
+    key, values = series_key([(np.array([100]), np.array([1.0])), (np.array([300]), np.array([3.0]))])
+    sampled = sample_events(key, values, 2, [200], 'nearest', 100)
+    assert sampled[0, 0] == 1.0 and sampled[1, 0] == 3.0
+    assert np.isnan(sample_events(key, values, 2, [200], 'interp', 100)).all()
+
+
+def test_unknown_mode():
+    with pytest.raises(ValueError):
+        sample_events(np.empty(0, dtype=np.int64), np.empty(0), 0, [], 'linear')
@@ -0,0 +1,109 @@
+import os
+
+from src.results_cache import ResultsCache, CACHE_FILE, WINDOWS_CACHE_FILE
+
+SETTINGS = {'BEST_L1': 43, 'sig_num_en': [0, 3]}
+VALUES = {'Best sat. L1 [dB-Hz]': 45.5, 'Num. of ExtEvent': 3}
+WINDOWS = [{'Window': 0, 'Band': '1', 'Best sat. [dB-Hz]': 44.0}, {'Window': 1, 'Band': '1', 'Best sat. [dB-Hz]': 46.5}]
+
+
+def cached(directory, sbf_file, settings=SETTINGS):
+    '''Runs one batch pass over sbf_file, returns what the cache had for it'''
+    cache = ResultsCache(directory, settings)
+    values = cache.get(sbf_file)
+    if values is None:
+        cache.put(str(sbf_file), VALUES)
+    cache.save()
+    return values
+
+
+def test_reuses_unchanged_file(tmp_path):
+    sbf_file = tmp_path / 'a.sbf'
+    sbf_file.write_bytes(b'$@' + bytes(30))
+    assert cached(tmp_path, sbf_file) is None
+    assert (tmp_path / CACHE_FILE).is_file()
+    assert cached(tmp_path, sbf_file) == VALUES
+
+
+def test_invalidated_by_settings(tmp_path):
+    sbf_file = tmp_path / 'a.sbf'
+    sbf_file.write_bytes(b'$@' + bytes(30))
+    cached(tmp_path, sbf_file)
+    assert cached(tmp_path, sbf_file, dict(SETTINGS, BEST_L1=44)) is None
+    assert cached(tmp_path, sbf_file, dict(SETTINGS, BEST_L1=44)) == VALUES
+
+
+def test_invalidated_by_content(tmp_path):
+    sbf_file = tmp_path / 'a.sbf'
+    sbf_file.write_bytes(b'$@' + bytes(30))
+    cached(tmp_path, sbf_file)
+    stat = sbf_file.stat()
+    # Same size and mtime, different header
+    sbf_file.write_bytes(b'$@' + bytes(29) + b'\x01')
+    os.utime(str(sbf_file), ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert cached(tmp_path, sbf_file) is None
+    # Appended to
+    with sbf_file.open('ab') as sbf_fobj:
+        sbf_fobj.write(bytes(4))
+    assert cached(tmp_path, sbf_file) is None
+    assert cached(tmp_path, sbf_file) == VALUES
+
+
+def test_drops_deleted_files(tmp_path):
+    files = [tmp_path / 'a.sbf', tmp_path / 'b.sbf']
+    cache = ResultsCache(tmp_path, SETTINGS)
+    for sbf_file in files:
+        sbf_file.write_bytes(b'$@' + bytes(30))
+        cache.get(sbf_file)
+        cache.put(str(sbf_file), VALUES)
+    cache.save()
+    cache = ResultsCache(tmp_path, SETTINGS)
+    assert sorted(cache.entries) == [str(sbf_file) for sbf_file in files]
+    files[1].unlink()
+    assert cache.get(files[0]) == VALUES
+    cache.save()
+    assert list(ResultsCache(tmp_path, SETTINGS).entries) == [str(files[0])]
+
+
+def test_ignores_unreadable_cache(tmp_path):
+    sbf_file = tmp_path / 'a.sbf'
+    sbf_file.write_bytes(b'$@' + bytes(30))
+    (tmp_path / CACHE_FILE).write_text('{not json')
+    assert cached(tmp_path, sbf_file) is None
+    assert cached(tmp_path, sbf_file) == VALUES
+
+
+def test_put_needs_get(tmp_path):
+    cache = ResultsCache(tmp_path, SETTINGS)
+    cache.put(str(tmp_path / 'a.sbf'), VALUES)
+    assert cache.entries == dict()
+
+
+def test_keeps_window_rows_in_their_own_file(tmp_path):
+    sbf_file = tmp_path / 'a.sbf'
+    sbf_file.write_bytes(b'$@' + bytes(30))
+    cache = ResultsCache(tmp_path, SETTINGS, windows=60.0)
+    assert cache.get(sbf_file) is None
+    cache.put(str(sbf_file), VALUES, WINDOWS)
+    cache.save()
+    assert 'Window' not in (tmp_path / CACHE_FILE).read_text()
+    cache = ResultsCache(tmp_path, SETTINGS, windows=60.0)
+    assert cache.get(sbf_file) == VALUES
+    assert cache.get_windows(sbf_file) == WINDOWS
+    # Without its window rows an entry is not reused
+    (tmp_path / WINDOWS_CACHE_FILE).unlink()
+    assert ResultsCache(tmp_path, SETTINGS, windows=60.0).get(sbf_file) is None
+
+
+def test_window_spec_does_not_invalidate_values(tmp_path):
+    sbf_file = tmp_path / 'a.sbf'
+    sbf_file.write_bytes(b'$@' + bytes(30))
+    cached(tmp_path, sbf_file)
+    cache = ResultsCache(tmp_path, SETTINGS, windows=60.0)
+    # Values are only reused together with window rows
+    assert cache.get(sbf_file) is None
+    cache.put(str(sbf_file), VALUES, WINDOWS)
+    cache.save()
+    assert cached(tmp_path, sbf_file) == VALUES
+    assert ResultsCache(tmp_path, SETTINGS, windows=60.0).get(sbf_file) == VALUES
+    assert ResultsCache(tmp_path, SETTINGS, windows='events').get(sbf_file) is None
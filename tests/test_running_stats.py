@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+from src import satellite as satellite_module
+from src import sbf_decode
+from src.satellite import Satellite
+from src.sbf_writer import write_sbf
+
+from .test_sbf_decode import TOW, WNC, meas_epoch, type1, type2, ext_event
+
+
+@pytest.fixture(scope='module')
+def sbf_file(tmp_path_factory):
+    sbf_file = tmp_path_factory.mktemp('running_stats') / 'log.sbf'
+    write_sbf(sbf_file, duration=30, n_sats=6, event_rate=3.0, seed=1)
+    return sbf_file
+
+
+def assert_same_checks(checks, expected):
+    assert checks.keys() == expected.keys()
+    for column, value in expected.items():
+        if isinstance(value, str):
+            assert checks[column] == value, column
+        else:
+            assert checks[column] == pytest.approx(value, rel=1e-9, nan_ok=True), column
+
+
+@pytest.mark.parametrize('chunk_blocks', [1, 2, satellite_module.CHUNK_BLOCKS])
+def test_streaming_matches_full_load(sbf_file, monkeypatch, chunk_blocks):
+    expected = Satellite(sbf_file).check()[1]
+    monkeypatch.setattr(satellite_module, 'CHUNK_BLOCKS', chunk_blocks)
+    assert expected['Num. of ExtEvent'] > 0
+    assert_same_checks(Satellite(sbf_file, streaming=True).check()[1], expected)
+
+
+@pytest.mark.parametrize('piece_bytes', [300, 4096, 1 << 20])
+def test_follow_matches_full_load(sbf_file, piece_bytes):
+    expected = Satellite(sbf_file).check()[1]
+    satellite = Satellite()
+    satellite.follow('log')
+    stream = sbf_decode.BlockStream()
+    log = sbf_file.read_bytes()
+    for start in range(0, len(log), piece_bytes):
+        satellite.update(*stream.feed(log[start:start + piece_bytes]))
+    checks = satellite.check()[1]
+    assert_same_checks(checks, expected)
+
+
+@pytest.mark.parametrize('chunk_blocks', [1, 2])
+def test_streaming_samples_events_logged_before_their_epoch(tmp_path, monkeypatch, chunk_blocks):
+    epochs = [meas_epoch(TOW + 100 * i, WNC, [type1(0, 5, 120 + i, i, [type2(3, 100 + i, i)])]) for i in range(6)]
+    # The event of epoch 3 arrives two epochs early, the one of epoch 1 right after it
+    log = epochs[0] + epochs[1] + ext_event(TOW + 150, WNC) + ext_event(TOW + 320, WNC) + b''.join(epochs[2:])
+    sbf_file = tmp_path / 'log.sbf'
+    sbf_file.write_bytes(log)
+    monkeypatch.setattr(satellite_module, 'CHUNK_BLOCKS', chunk_blocks)
+    checks = Satellite(sbf_file, streaming=True).check()[1]
+    assert checks['Best sat. L1 [dB-Hz]'] == np.mean([10 + 121 * 0.25, 10 + 123 * 0.25])
+    assert_same_checks(checks, Satellite(sbf_file).check()[1])
@@ -0,0 +1,43 @@
+import multiprocessing
+import os
+
+import pytest
+
+from src import sat_statistics
+from src.timings import Timings
+
+
+class CrashingSatellite:
+    '''Stands in for Satellite, the worker process loading a file named crash*.sbf dies'''
+
+    def __init__(self, sbf_file, **options):
+        if os.path.basename(str(sbf_file)).startswith('crash'):
+            os._exit(1)
+        self.sbf_file = sbf_file
+        self.timings = Timings()
+
+    def check(self):
+        return str(self.sbf_file), {'Num. of ExtEvent': 1}
+
+
+@pytest.mark.skipif(multiprocessing.get_start_method() != 'fork',
+                    reason='the worker processes need to inherit the patched Satellite')
+def test_process_files_survives_dead_worker(tmp_path, monkeypatch):
+    monkeypatch.setattr(sat_statistics, 'Satellite', CrashingSatellite)
+    files = [tmp_path / '{:02d}.sbf'.format(i) for i in range(20)]
+    files[1] = tmp_path / 'crash.sbf'
+    results = list(sat_statistics.process_files(files, jobs=2))
+
+    assert [idx for idx, values, timings, window_rows in results] == [str(file) for file in files]
+    failed = [idx for idx, values, timings, window_rows in results if values is None]
+    assert str(files[1]) in failed
+    # At most the files queued in the pool when it broke are lost, the others are processed serially
+    assert len(failed) <= 2 * sat_statistics.QUEUE_DEPTH + 1
+    assert results[-1][1] == {'Num. of ExtEvent': 1}
+
+
+def test_process_files_serial(tmp_path, monkeypatch):
+    monkeypatch.setattr(sat_statistics, 'Satellite', CrashingSatellite)
+    files = [tmp_path / '{}.sbf'.format(i) for i in range(3)]
+    results = list(sat_statistics.process_files(files))
+    assert [values for idx, values, timings, window_rows in results] == [{'Num. of ExtEvent': 1}] * 3
@@ -0,0 +1,290 @@
+'''Decoder tests against blocks assembled field by field from the AsteRx-m2 reference guide chapter 4
+
+The blocks are packed with struct here, independently of sbf_writer, and
+their CRC is computed with a bitwise CRC-CCITT instead of binascii.'''
+import struct
+
+import numpy as np
+import pytest
+
+from src import sbf_decode
+from src.satellite import LoadCancelled, Satellite
+from src.sbf_index import INDEX_SETTINGS, SbfFile
+from src.signal_cache import SignalCache
+
+TOW = 345600100
+WNC = 2245
+
+
+def crc_ccitt(data):
+    '''CRC-16 with polynomial 0x1021 and initial value 0, as in reference guide section 4.1.4'''
+    crc = 0
+    for byte in data:
+        crc ^= byte << 8
+        for _ in range(8):
+            crc = (crc << 1 ^ 0x1021 if crc & 0x8000 else crc << 1) & 0xffff
+    return crc
+
+
+def block(block_id, revision, body):
+    '''Sync, CRC, ID and Length header followed by body, padded to a multiple of 4 bytes'''
+    body += b'\x00' * (-(len(body) + 8) % 4)
+    id_length = struct.pack('<HH', block_id | revision << 13, len(body) + 8)
+    return b'$@' + struct.pack('<H', crc_ccitt(id_length + body)) + id_length + body
+
+
+def type1(sig_type, svid, cn0, locktime, type2=(), padding=0):
+    '''RxChannel, Type, SVID, Misc, CodeLSB, Doppler, CarrierLSB, CarrierMSB, CN0, LockTime, ObsInfo, N2'''
+    return struct.pack('<BBBBIiHbBHBB', 7, sig_type, svid, 0, 123456, -2500, 4321, -3, cn0, locktime, 0,
+                       len(type2)) + b'\xff' * padding + b''.join(type2)
+
+
+def type2(sig_type, cn0, locktime, padding=0):
+    '''Type, LockTime, CN0, OffsetsMSB, CarrierMSB, ObsInfo, CodeOffsetLSB, CarrierLSB, DopplerOffsetLSB'''
+    return struct.pack('<BBBBbBHHH', sig_type, locktime, cn0, 0, 1, 0, 11, 22, 33) + b'\xff' * padding
+
+
+def meas_epoch(tow, wnc, sub_blocks, sb1_length=20, sb2_length=12):
+    '''TOW, WNc, N1, SB1Length, SB2Length, CommonFlags, CumClkJumps, Reserved'''
+    return block(4027, 0, struct.pack('<IHBBBBBB', tow, wnc, len(sub_blocks), sb1_length, sb2_length, 0, 0, 0) +
+                 b''.join(sub_blocks))
+
+
+def ext_event(tow, wnc):
+    '''TOW, WNc, Source, Polarity, Offset, RxClkBias, PVTAge'''
+    return block(5924, 1, struct.pack('<IHBBfdH', tow, wnc, 2, 0, 0.25, 0.5, 0))
+
+
+def receiver_status(tow, wnc, agc):
+    '''TOW, WNc, CPULoad, ExtError, UpTime, RxState, RxError, N, SBLength, CmdCount, Temperature,
+    then per AGCState FrontendID, Gain, SampleVar, BlankingStat'''
+    return block(4014, 1, struct.pack('<IHBBIIIBBBB', tow, wnc, 20, 0, 3600, 0, 0, len(agc), 4, 0, 100) +
+                 b''.join(struct.pack('<BbBB', frontend, gain, 80, 0) for frontend, gain in agc))
+
+
+def sample_log():
+    '''A PVTGeodetic-like block which is not decoded, two epochs, an event and a status block,
+    with garbage and a block with a wrong CRC between them'''
+    other = block(4007, 2, struct.pack('<IH', TOW, WNC) + bytes(range(30)))
+    first = meas_epoch(TOW, WNC, [
+        type1(0, 5, 128, 300, [type2(3, 104, 60)]),
+        type1(8, 40, 140, 65535)
+    ])
+    second = meas_epoch(TOW + 100, WNC, [
+        type1(0, 5, 129, 301, [type2(3, 100, 61, padding=4)], padding=4),
+    ], sb1_length=24, sb2_length=16)
+    corrupt = bytearray(meas_epoch(TOW + 200, WNC, [type1(0, 9, 150, 1)]))
+    corrupt[-5] ^= 0xff
+    return (b'\x00$' + other + b'garbage$@' + first + bytes(corrupt) + ext_event(TOW + 153, WNC) + second +
+            receiver_status(TOW + 100, WNC, [(0, 32), (3, -5)]))
+
+
+def test_crc_ccitt_check_value():
+    # Check value of CRC-16/XMODEM
+    assert crc_ccitt(b'123456789') == 0x31c3
+
+
+def test_scan_blocks_finds_valid_blocks_only():
+    log = sample_log()
+    index, end = sbf_decode.scan_blocks(log)
+    assert index['id'].tolist() == [4007, 4027, 5924, 4027, 4014]
+    assert end == len(log)
+    for offset, length in zip(index['offset'].tolist(), index['length'].tolist()):
+        assert log[offset:offset + 2] == b'$@'
+        assert offset + length <= len(log)
+
+
+def test_scan_blocks_stops_at_incomplete_block():
+    log = sample_log()
+    index, end = sbf_decode.scan_blocks(log[:-6])
+    assert index['id'].tolist() == [4007, 4027, 5924, 4027]
+    assert log[end:end + 2] == b'$@'
+
+
+def reference_scan(buf, start, end, final=False):
+    '''Block by block scan, one sync candidate after the other'''
+    blocks, pos = list(), buf.find(b'$@', start, end)
+    while 0 <= pos and (pos + 8 <= end or final):
+        crc, block_id, length = struct.unpack_from('<HHH', buf.ljust(pos + 8, b'\x00'), pos + 2)
+        if length < 8 or length % 4 or (final and pos + length > end):
+            pos = buf.find(b'$@', pos + 1, end)
+        elif pos + length > end:
+            return blocks, pos
+        elif crc_ccitt(buf[pos + 4:pos + length]) == crc:
+            blocks.append((pos, block_id & 0x1fff, length))
+            pos = buf.find(b'$@', pos + length, end)
+        else:
+            pos = buf.find(b'$@', pos + 1, end)
+    if pos >= 0:
+        return blocks, pos
+    if final:
+        return blocks, end
+    tail = blocks[-1][0] + blocks[-1][2] if blocks else start
+    return blocks, end - 1 if end > tail and buf[end - 1:end] == b'$' else end
+
+
+@pytest.mark.parametrize('final', [False, True])
+@pytest.mark.parametrize('seed', range(20))
+def test_scan_blocks_matches_reference(seed, final, monkeypatch):
+    rng = np.random.default_rng(seed)
+    pieces = list()
+    for _ in range(40):
+        kind = rng.integers(5)
+        if kind == 0:
+            # Garbage with plenty of false syncs and headers
+            pieces.append(bytes(rng.choice([0x24, 0x40, 0x00, 0x10, 0xbb, 0x0f], rng.integers(1, 40)).tolist()))
+        elif kind == 1:
+            corrupt = bytearray(ext_event(TOW, WNC))
+            corrupt[rng.integers(4, len(corrupt))] ^= 0x01
+            pieces.append(bytes(corrupt))
+        elif kind == 2:
+            pieces.append(receiver_status(TOW, WNC, [(0, 1)] * int(rng.integers(4))))
+        else:
+            pieces.append(meas_epoch(TOW, WNC, [type1(0, 5, 100, 1, [type2(3, 90, 2)] * int(rng.integers(3)))]))
+    log = b''.join(pieces)
+    # Small windows so blocks cross window boundaries
+    monkeypatch.setattr(sbf_decode, 'CHUNK_BYTES', int(rng.integers(16, 200)))
+    for start, end in ((0, len(log)), (int(rng.integers(len(log))), len(log)), (0, int(rng.integers(len(log))))):
+        blocks, pos = reference_scan(log, start, end, final)
+        index, end_pos = sbf_decode.scan_blocks(log, start, end, final=final)
+        assert list(zip(index['offset'].tolist(), index['id'].tolist(), index['length'].tolist())) == blocks
+        assert end_pos == pos
+
+
+def corrupt_header_near_end():
+    '''sample_log with a header of a bad CRC and a length running past the end before its last blocks'''
+    header = b'$@' + struct.pack('<HHH', 0, 4027, 40000)
+    return sample_log() + header + ext_event(TOW + 300, WNC) + meas_epoch(TOW + 300, WNC, [type1(0, 5, 130, 1)])
+
+
+def test_scan_steps_over_corrupt_header_near_end_of_file(tmp_path):
+    log = corrupt_header_near_end()
+    index, end = sbf_decode.scan_blocks(log)
+    assert index['id'].tolist() == [4007, 4027, 5924, 4027, 4014]
+    index, end = sbf_decode.scan_blocks(log, final=True)
+    assert index['id'].tolist() == [4007, 4027, 5924, 4027, 4014, 5924, 4027]
+    assert end == len(log)
+    sbf_file = tmp_path / 'log.sbf'
+    sbf_file.write_bytes(log)
+    for chunk_bytes in (64, 1 << 20):
+        with sbf_file.open('rb') as sbf_fobj:
+            ids = [block_id for _, index in sbf_decode.read_chunks(sbf_fobj, chunk_bytes)
+                   for block_id in index['id'].tolist()]
+        assert ids == [4007, 4027, 5924, 4027, 4014, 5924, 4027]
+    for streaming in (False, True):
+        assert Satellite(sbf_file, streaming=streaming).check()[1]['Num. of ExtEvent'] == 2
+
+
+def test_block_index_is_cached_away_from_the_file(tmp_path):
+    sbf_file = tmp_path / 'log' / 'log.sbf'
+    sbf_file.parent.mkdir()
+    sbf_file.write_bytes(sample_log())
+    cache = SignalCache(tmp_path / 'cache')
+    with SbfFile(sbf_file, cache) as sbf:
+        index = sbf.index.copy()
+    assert [path.name for path in sbf_file.parent.iterdir()] == ['log.sbf']
+    with SbfFile(sbf_file, cache) as sbf:
+        assert isinstance(sbf.index, np.memmap)
+        assert np.array_equal(sbf.index, index)
+    assert index['tow'].tolist() == [TOW, TOW, TOW + 153, TOW + 100, TOW + 100]
+    Satellite(sbf_file)
+    assert [path.name for path in sbf_file.parent.iterdir()] == ['log.sbf']
+
+
+def test_decode_meas_epoch():
+    log = sample_log()
+    data = np.frombuffer(log, dtype=np.uint8)
+    index, _ = sbf_decode.scan_blocks(log)
+    meas = index[index['id'] == sbf_decode.MEAS_EPOCH_V2]
+    rows = sbf_decode.decode_meas_epoch(data, meas['offset'], meas['length'])
+    assert rows['tow'].tolist() == [TOW, TOW, TOW, TOW + 100, TOW + 100]
+    assert rows['wnc'].tolist() == [WNC] * 5
+    assert rows['svid'].tolist() == [5, 5, 40, 5, 5]
+    assert rows['sig_type'].tolist() == [0, 3, 8, 0, 3]
+    assert rows['cn0'].tolist() == [128, 104, 140, 129, 100]
+    assert rows['locktime'].tolist() == [300, 60, 65535, 301, 61]
+    assert sbf_decode.meas_epoch_tow(data, meas['offset']).tolist() == [TOW, TOW + 100]
+
+    rows = sbf_decode.decode_meas_epoch(data, meas['offset'], meas['length'], sig_nums={3})
+    assert rows['svid'].tolist() == [5, 5]
+    assert rows['cn0'].tolist() == [104, 100]
+
+
+def test_decode_ext_event_and_receiver_status():
+    log = sample_log()
+    data = np.frombuffer(log, dtype=np.uint8)
+    index, _ = sbf_decode.scan_blocks(log)
+    events = sbf_decode.decode_ext_event(data, index['offset'][index['id'] == sbf_decode.EXT_EVENT])
+    assert events['tow'].tolist() == [TOW + 153]
+    assert events['wnc'].tolist() == [WNC]
+    status = sbf_decode.decode_receiver_status(data, index['offset'][index['id'] == sbf_decode.RECEIVER_STATUS_V2])
+    assert status['tow'].tolist() == [TOW + 100, TOW + 100]
+    assert status['frontend_id'].tolist() == [0, 3]
+    assert status['gain'].tolist() == [32, -5]
+
+
+def test_block_stream_joins_pieces():
+    log = sample_log()
+    stream = sbf_decode.BlockStream()
+    ids = list()
+    for start in range(0, len(log), 7):
+        data, index = stream.feed(log[start:start + 7])
+        ids.extend(index['id'].tolist())
+    assert ids == [4007, 4027, 5924, 4027, 4014]
+
+
+@pytest.mark.parametrize('streaming', [False, True])
+def test_satellite_load(tmp_path, streaming):
+    sbf_file = tmp_path / 'log.sbf'
+    sbf_file.write_bytes(sample_log())
+    satellite = Satellite(sbf_file, streaming=streaming)
+    # The PVTGeodetic-like block is not counted
+    assert satellite.n_blocks == 4
+    if not streaming:
+        # CN0 of signal numbers other than 1 and 2 is stored with an offset of 10 dB-Hz
+        assert satellite.signals[(0, 5)]['cn0'].tolist() == [42.0, 42.25]
+        assert satellite.signals[(3, 5)]['cn0'].tolist() == [36.0, 35.0]
+        assert satellite.signals[(8, 40)]['cn0'].tolist() == [45.0]
+    checks = satellite.check()[1]
+    assert checks['Num. of ExtEvent'] == 1
+    assert checks['Best sat. L1 [dB-Hz]'] == 42.25
+    assert checks['Best sat. L2 [dB-Hz]'] == 35.0
+    assert checks['Frontend gain avg: GPSL1/E1'] == 32
+    assert checks['Frontend gain avg: GPSL2'] == -5
+
+
+@pytest.mark.parametrize('streaming', [False, True])
+@pytest.mark.parametrize('content', [b'garbage', b'', b'$@\x00\x00\xbb\x0f\x10\x00' + bytes(8)])
+def test_satellite_load_rejects_files_without_blocks(tmp_path, streaming, content):
+    sbf_file = tmp_path / 'log.sbf'
+    sbf_file.write_bytes(content)
+    with pytest.raises(ValueError):
+        Satellite(sbf_file, streaming=streaming)
+
+
+def test_load_progress_covers_the_index_scan(tmp_path, monkeypatch):
+    sbf_file = tmp_path / 'log.sbf'
+    sbf_file.write_bytes(sample_log() * 20)
+    size = sbf_file.stat().st_size
+    monkeypatch.setattr(sbf_decode, 'CHUNK_BYTES', 256)
+    reports = list()
+    satellite = Satellite(signal_cache=SignalCache(tmp_path / 'cache'))
+    satellite.load_file(sbf_file, progress=lambda bytes_read, blocks: reports.append((bytes_read, blocks)))
+    scanned = [bytes_read for bytes_read, blocks in reports if not blocks]
+    assert len(scanned) > 1 and scanned[-1] == size // 2
+    assert [bytes_read for bytes_read, blocks in reports] == sorted(bytes_read for bytes_read, blocks in reports)
+    assert reports[-1][0] == size
+
+
+def test_load_can_be_cancelled_during_the_index_scan(tmp_path, monkeypatch):
+    sbf_file = tmp_path / 'log.sbf'
+    sbf_file.write_bytes(sample_log() * 20)
+    monkeypatch.setattr(sbf_decode, 'CHUNK_BYTES', 256)
+    cache = SignalCache(tmp_path / 'cache')
+
+    def cancel(bytes_read, blocks):
+        raise LoadCancelled()
+
+    with pytest.raises(LoadCancelled):
+        Satellite(signal_cache=cache).load_file(sbf_file, progress=cancel)
+    assert cache.get(sbf_file, INDEX_SETTINGS) is None
@@ -0,0 +1,63 @@
+import numpy as np
+
+from src.signal_store import ColumnBuffer, SignalStore, EVENT_COLUMNS, wrap_columns
+
+
+def test_column_buffer_grows_and_keeps_rows():
+    buffer = ColumnBuffer(EVENT_COLUMNS, capacity=2)
+    expected = list()
+    for n in (1, 2, 3, 0, 7, 40):
+        tow = np.arange(len(expected), len(expected) + n, dtype=np.uint32)
+        buffer.extend(tow=tow, wnc=tow % 3)
+        expected.extend(tow.tolist())
+        assert len(buffer) == len(expected)
+        assert buffer.capacity() >= len(buffer)
+        assert buffer['tow'].tolist() == expected
+        assert buffer['wnc'].tolist() == [tow % 3 for tow in expected]
+    assert buffer['tow'].dtype == np.uint32
+    assert buffer['wnc'].dtype == np.uint16
+
+
+def test_column_buffer_doubles_capacity():
+    buffer = ColumnBuffer(EVENT_COLUMNS, capacity=4)
+    buffer.extend(tow=np.arange(5), wnc=np.zeros(5))
+    assert buffer.capacity() == 8
+    buffer.extend(tow=np.arange(20), wnc=np.zeros(20))
+    assert buffer.capacity() == 25
+
+
+def test_column_buffer_grows_from_zero_capacity():
+    buffer = ColumnBuffer(EVENT_COLUMNS, capacity=0)
+    buffer.extend(tow=[5], wnc=[1])
+    buffer.extend(tow=[6, 7], wnc=[1, 1])
+    assert buffer['tow'].tolist() == [5, 6, 7]
+
+
+def test_shrink_to_fit():
+    buffer = ColumnBuffer(EVENT_COLUMNS)
+    buffer.extend(tow=[1, 2, 3], wnc=[0, 0, 0])
+    buffer.shrink_to_fit()
+    assert buffer.capacity() == 3
+    assert buffer['tow'].tolist() == [1, 2, 3]
+
+
+def test_wrap_columns_does_not_copy():
+    tow = np.arange(4, dtype=np.uint32)
+    buffer = wrap_columns(tow=tow, wnc=np.zeros(4, dtype=np.uint16))
+    assert len(buffer) == 4
+    assert np.shares_memory(buffer['tow'], tow)
+    buffer.extend(tow=[9], wnc=[0])
+    assert buffer['tow'].tolist() == [0, 1, 2, 3, 9]
+
+
+def test_signal_store_groups_by_signal_and_satellite():
+    store = SignalStore()
+    store.extend(tow=[100, 100, 100, 200], wnc=[1, 1, 1, 1], sig_num=[0, 3, 0, 0], svid=[5, 5, 7, 5],
+                 cn0=[40.0, 30.0, 41.0, 42.0], locktime=[1, 2, 3, 4])
+    store.extend(tow=[300], wnc=[1], sig_num=[0], svid=[5], cn0=[43.0], locktime=[5])
+    store.finalize()
+    assert sorted(key for key, columns in store.items()) == [(0, 5), (0, 7), (3, 5)]
+    assert store[(0, 5)]['tow'].tolist() == [100, 200, 300]
+    assert store[(0, 5)]['cn0'].tolist() == [40.0, 42.0, 43.0]
+    assert store[(3, 5)]['locktime'].tolist() == [2]
+    assert len(store) == 5
@@ -0,0 +1,102 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.band_statistics import band_summary
+from src.gps_time import MS_PER_WEEK
+from src.satellite import Satellite, WINDOW_EVENTS
+from src.window_stats import WINDOW_STAT_COLUMNS, WindowIndex, max_tree, range_max
+from tests.test_band_statistics import THRESHOLDS, random_series
+from tests.test_event_sampling import brute_force as sample_brute_force
+from tests.test_sbf_decode import WNC, ext_event, meas_epoch, type1
+
+
+def test_windows_split_at_week_rollover(tmp_path):
+    log = b''
+    for wnc, tow in ((WNC, MS_PER_WEEK - 200), (WNC, MS_PER_WEEK - 100), (WNC + 1, 0), (WNC + 1, 100)):
+        log += meas_epoch(tow, wnc, [type1(0, 5, 160 + tow % 1000 // 100, 1)])
+    log += ext_event(MS_PER_WEEK - 150, WNC) + ext_event(50, WNC + 1)
+    sbf_file = tmp_path / 'log.sbf'
+    sbf_file.write_bytes(log)
+    satellite = Satellite(sbf_file)
+    assert satellite.windows(0.3) == [(WNC, MS_PER_WEEK - 200, MS_PER_WEEK - 1), (WNC + 1, 0, 99),
+                                      (WNC + 1, 100, 399)]
+    assert satellite.windows(WINDOW_EVENTS) == [(WNC, MS_PER_WEEK - 150, MS_PER_WEEK - 1), (WNC + 1, 0, 49)]
+    rows = [row for row in satellite.window_rows(0.3) if row['Band'] == '1']
+    assert [row['Window'] for row in rows] == [0, 1, 2]
+    assert [row['WNc [weeks]'] for row in rows] == [WNC, WNC + 1, WNC + 1]
+    assert [row['Num. of ExtEvent'] for row in rows] == [1, 1, 0]
+    assert [row['Num. of sat. [ ]'] for row in rows] == [1, 1, 1]
+
+
+def test_windows_need_stored_series(tmp_path):
+    sbf_file = tmp_path / 'log.sbf'
+    sbf_file.write_bytes(meas_epoch(1000, WNC, [type1(0, 5, 160, 1)]))
+    with pytest.raises(ValueError):
+        Satellite(sbf_file, streaming=True).windows(1)
+
+
+def random_index(rng, mode):
+    keys, series = random_series(rng)
+    events = np.sort(rng.integers(800, 9000, rng.integers(0, 20)))
+    return keys, series, events, WindowIndex(keys, series, THRESHOLDS, events, mode, 150)
+
+
+@pytest.mark.parametrize('mode', ['snap', 'nearest', 'interp'])
+@pytest.mark.parametrize('seed', range(5))
+def test_query_matches_brute_force(mode, seed):
+    rng = np.random.default_rng(seed)
+    keys, series, events, index = random_index(rng, mode)
+    sampled = sample_brute_force(series, events, mode, 150)
+    for first, last in np.sort(rng.integers(0, 10000, (10, 2)), axis=1):
+        table = index.query(first, last)
+        in_window = (events >= first) & (events <= last)
+        expected = list()
+        for i, ((band, sat, sig_num, svid), (tow, cn0)) in enumerate(zip(keys, series)):
+            values = cn0[(tow >= first) & (tow <= last)]
+            found = sampled[i, in_window][~np.isnan(sampled[i, in_window])]
+            if not values.size and not found.size:
+                continue
+            mean = values.mean() if values.size else 0.0
+            event_mean = found.mean() if found.size else np.nan
+            expected.append({
+                'band': band, 'sat': sat, 'sig_num': sig_num, 'svid': svid, 'count': values.size,
+                'mean': mean, 'max': values.max() if values.size else np.nan,
+                'n_over_best': np.count_nonzero(values >= THRESHOLDS[band][0]),
+                'n_over_good': np.count_nonzero(values >= THRESHOLDS[band][1]),
+                'event_count': found.size, 'event_mean': event_mean,
+                'value': (event_mean if found.size else 0.0) if in_window.any() else mean
+            })
+        expected = pd.DataFrame(expected, columns=WINDOW_STAT_COLUMNS)
+        assert list(table.columns) == WINDOW_STAT_COLUMNS
+        pd.testing.assert_frame_equal(table, expected, check_dtype=False, check_index_type=False)
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_summaries_match_band_summary(seed):
+    rng = np.random.default_rng(seed)
+    _, _, _, index = random_index(rng, 'snap')
+    windows = np.sort(rng.integers(0, 10000, (20, 2)), axis=1)
+    for band in THRESHOLDS:
+        summaries = index.summaries(windows[:, 0], windows[:, 1], band, 4, THRESHOLDS[band])
+        for i, (first, last) in enumerate(windows):
+            summary = band_summary(index.query(first, last), band, 4, THRESHOLDS[band])
+            assert summaries['n_sats'][i] == summary['n_sats']
+            assert summaries['top_length'][i] == summary['top_length']
+            if summary['n_sats']:
+                assert summaries['max'][i] == pytest.approx(summary['max'])
+                assert summaries['top_mean'][i] == pytest.approx(summary['top_mean'])
+            else:
+                assert np.isnan(summaries['max'][i]) and np.isnan(summaries['top_mean'][i])
+            for threshold in THRESHOLDS[band]:
+                assert summaries['n_over'][threshold][i] == summary['n_over'][threshold]
+
+
+@pytest.mark.parametrize('size', [0, 1, 2, 7, 64, 100])
+def test_range_max_matches_brute_force(size):
+    rng = np.random.default_rng(size)
+    values = rng.uniform(0, 50, size)
+    lo, hi = np.sort(rng.integers(0, size + 1, (2, 200)), axis=0)
+    result = range_max(max_tree(values), lo, hi)
+    expected = [values[l:h].max() if h > l else np.nan for l, h in zip(lo, hi)]
+    np.testing.assert_array_equal(result, expected)